@@ -1,8 +1,13 @@
-from model import db, Congressperson, BillCategory, Bill
-from model.helpers import remove_middle_name
-from model.consts import REPRESENTATIVE_URL, CIVIC_KEY, BILL_BY_CATEGORY_URL, PROPUBLICA_KEY
+from datetime import datetime
+from itertools import chain
+from model import db, Congressperson, BillCategory, Bill, Vote, VotePosition, AddressLookup, SyncCheckpoint
+from model.helpers import (normalize_name, parse_date, normalize_address, parse_zip_code, parse_state,
+                           iter_json_items, iter_batches)
+from model.consts import (REPRESENTATIVE_URL, CIVIC_KEY, BILL_BY_CATEGORY_URL, ROLL_CALL_URL, INGEST_CONCURRENCY,
+                          INGEST_BATCH_SIZE)
+from model.api_client import propublica, civic
+from model.district_resolver import district_resolver
 from model.helpers import format_category_name
-import requests
 
 
 def find_representatives(user):
@@ -11,81 +16,237 @@ def find_representatives(user):
     :return [Congressperson]: congresspeople associated with User's address
     """
 
+    # Most ZIP codes lie in a single district, those are answered from the imported districts without any api
+    zip_code = parse_zip_code(user.address)
+    if zip_code:
+        district_resolver.refresh_if_stale()
+        district = district_resolver.resolve(zip_code)
+        if district:
+            return Congressperson.get_for_district(*district)
+
+    # Addresses rarely change, so reuse the last lookup for this address until it expires
+    address = normalize_address(user.address)
+    lookup = AddressLookup.get_fresh(address)
+    if lookup:
+        return lookup.get_congresspeople()
+
     # Retrieves json from google api to get json of local politicians
     search_address = "&address=" + user.address
-    request = requests.get(REPRESENTATIVE_URL + CIVIC_KEY + search_address)
-    politician_json = request.json()
+    politician_json = civic.get_json(REPRESENTATIVE_URL + CIVIC_KEY + search_address)
 
     politician_info = politician_json['officials']
 
-    # instantiate list for politicians and loop through json
-    congresspeople = []
-    for politician in politician_info:
-        # eliminate middle names so we can find politicians based on first and last name
-        name = remove_middle_name(politician['name'])
-
-        # check if congressperson is in database, if so, add them to list
-        congressperson = Congressperson.query.filter_by(name=name).first()
+    # Civic lists every official for the address, so match them all against Congress in one query, within the
+    # address's state since members of different states can share a name
+    name_keys = {normalize_name(politician['name']) for politician in politician_info}
+    query = Congressperson.query.filter(Congressperson.name_key.in_(name_keys))
+    state = politician_json.get('normalizedInput', {}).get('state') or parse_state(user.address)
+    if state:
+        query = query.filter(Congressperson.state == state.upper())
+    congresspeople = query.all()
 
-        if congressperson:
-            congresspeople.append(congressperson)
+    AddressLookup.store(address, congresspeople)
     return congresspeople
 
 
+def get_category_url(category):
+    """Builds the ProPublica url listing the most recent bills for a subject/category
+        :param category: Category
+        :return str: url for the category's bills
+    """
+
+    return BILL_BY_CATEGORY_URL.replace("{subject}", format_category_name(category))
+
+
 def parse_bills_by_category(category):
     """Grabs 20 most recent bills from ProPublica api associated with specific subject/category
         :param category: Category which you want to associate bills with
         :return None: Update database with bills associated with category
     """
 
-    # Create subject so it can be passed into REST call and place in URL
-    subject = format_category_name(category)
-    search_url = BILL_BY_CATEGORY_URL.replace("{subject}", subject)
+    search_url = get_category_url(category)
     print(search_url)
 
-    # Send request and parse it
-    fill_bill_request = requests.get(search_url, headers={'X-API-Key': PROPUBLICA_KEY})
-    print(fill_bill_request.text)
-    bill_json = fill_bill_request.json()
+    fields = {'status': None}
+    with propublica.stream(search_url) as body:
+        store_bills(iter_json_items(body, "results", fields), category)
 
-    parse_bills_from_json(bill_json, category)
+    if fields['status'] == "ERROR":
+        print("No results found")
+
+
+def load_bills_by_categories(categories, concurrency=INGEST_CONCURRENCY):
+    """Grabs the most recent bills for many categories, downloading several subjects at once
+        :param categories: [Category] categories to load bills for
+        :param concurrency: int, most ProPublica requests in flight at once
+        :return None: Update database with bills associated with each category
+    """
+
+    search_urls = [get_category_url(category) for category in categories]
+
+    # Responses come back in order, and are written to the database one category at a time on this thread
+    for category, (search_url, response) in zip(categories, propublica.get_many(search_urls, concurrency)):
+        print(search_url)
+        if response is None:
+            continue
+
+        try:
+            bill_json = response.json()
+        except ValueError:
+            print('Decoding JSON has failed')
+            continue
+
+        parse_bills_from_json(bill_json, category)
 
 
 def parse_bills_from_json(json, category):
     """Takes bill json and category and updates database with new bill information
     :param json: Bill JSON
     :param category: Category
-    :return None: updates database with new bill information
+    :return dict: number of bills inserted and updated, updates database with new bill information
     """
 
     # Check to make sure there are no errors in database
     if json.get('error') or json.get('errors') or json.get('status') == "ERROR":
         print("No results found")
-        return
+        return {'inserted': 0, 'updated': 0}
 
-    bills = json['results']
-    for bill in bills:
+    return store_bills(json['results'], category)
 
-        bill_id = bill['bill_id']
 
-        # Check to see if bill already exists, if so just add new BillCategory
-        if Bill.query.filter_by(bill_id=bill_id).first():
-            bill_category = BillCategory(bill_id=bill_id, category_id=category.category_id)
-            db.session.add(bill_category)
+def store_bills(bills, category):
+    """Stores bills of a category a batch at a time, so bills can be streamed in as they are parsed
+    :param bills: iterable of bill dictionaries from a ProPublica subject JSON
+    :param category: Category
+    :return dict: number of bills inserted and updated
+    """
 
-        # Parse JSON and get information needed
-        else:
-            bill_title = bill['short_title']
-            bill_uri = bill['congressdotgov_url']
-            summary = bill['summary']
+    counts = {'inserted': 0, 'updated': 0}
+    for batch in iter_batches(bills, INGEST_BATCH_SIZE):
+        batch_counts = store_bill_batch(batch, category)
+        counts['inserted'] += batch_counts['inserted']
+        counts['updated'] += batch_counts['updated']
+    return counts
 
-            bill = Bill(bill_id=bill_id,
-                        bill_title=bill_title,
-                        bill_uri=bill_uri,
-                        summary=summary,
+
+def store_bill_batch(bills, category):
+    """Inserts new bills, updates bills with new action and links them all to the category
+    :param bills: [dict] bill dictionaries from a ProPublica subject JSON
+    :param category: Category
+    :return dict: number of bills inserted and updated
+    """
+
+    # Index bills by id, which also drops any bill listed twice in the batch
+    bills = {bill['bill_id']: bill for bill in bills}
+    bill_ids = list(bills)
+
+    # Find out which bills and bill categories already exist with one query each
+    stored_action_dates = dict(db.session.query(Bill.bill_id, Bill.latest_action_date)
+                               .filter(Bill.bill_id.in_(bill_ids)))
+    linked_bill_ids = {bill_id for bill_id, in db.session.query(BillCategory.bill_id)
+                       .filter(BillCategory.category_id == category.category_id, BillCategory.bill_id.in_(bill_ids))}
+
+    # Parse JSON and get information needed, only keeping bills that are new or have had action since we saw them
+    new_bills = []
+    changed_bills = []
+    for bill_id, bill in bills.items():
+        latest_action_date = bill.get('latest_major_action_date')
+        bill_row = {'bill_id': bill_id,
+                    'bill_title': bill['short_title'],
+                    'bill_uri': bill['congressdotgov_url'],
+                    'summary': bill['summary'],
+                    'latest_action_date': parse_date(latest_action_date) if latest_action_date else None,
+                    }
+
+        # New action may mean a new roll call, so clearing refreshed_at queues the bill for the refresh worker
+        if bill_id not in stored_action_dates:
+            new_bills.append(bill_row)
+        elif stored_action_dates[bill_id] != bill_row['latest_action_date']:
+            bill_row['refreshed_at'] = None
+            changed_bills.append(bill_row)
+
+    new_bill_categories = [{'bill_id': bill_id, 'category_id': category.category_id}
+                           for bill_id in bill_ids if bill_id not in linked_bill_ids]
+
+    db.session.bulk_insert_mappings(Bill, new_bills)
+    db.session.bulk_update_mappings(Bill, changed_bills)
+    db.session.bulk_insert_mappings(BillCategory, new_bill_categories)
+    if new_bills or changed_bills or new_bill_categories:
+        SyncCheckpoint.mark_content_changed()
+    db.session.commit()
+
+    return {'inserted': len(new_bills), 'updated': len(changed_bills)}
+
+
+def load_votes_for_bill(bill):
+    """Grabs every roll call on a bill from ProPublica and stores the bill's roll call info and each member's position
+        :param bill: Bill whose votes you want stored
+        :return None: updates database with the bill's roll call info, Votes and VotePositions
+    """
+
+    # Create bill slug, then use it to call ProPublica api
+    search_url = ROLL_CALL_URL.replace("{bill-id}", bill.get_bill_slug())
+    print(search_url)
+
+    bill_json = propublica.get_json(search_url)
+
+    # Error statuses raise, so a failed request leaves the bill stale for the worker to retry. A bill ProPublica
+    # doesn't know comes back as an ERROR status and is stored as having no roll calls.
+    if bill_json.get('error') or bill_json.get('errors') or bill_json.get('status') == "ERROR":
+        print("No results found")
+        json_votes = []
+    else:
+        json_votes = bill_json['results'][0]['votes']
+        bill.parse_roll_call_info(json_votes)
+
+    parse_votes_from_json(json_votes, bill)
+
+
+def parse_votes_from_json(json_votes, bill):
+    """Takes the roll calls listed on a bill and stores every member's position on each of them
+        :param json_votes: list of roll call dictionaries from a ProPublica bill JSON
+        :param bill: Bill the roll calls belong to
+        :return None: updates database with new vote information
+    """
+
+    stored_urls = {vote.api_url for vote in Vote.query.filter_by(bill_id=bill.bill_id)}
+
+    for result in json_votes:
+        api_url = result['api_url']
+
+        # Roll calls never change once held, so only download the ones we do not have yet
+        if api_url in stored_urls:
+            continue
+
+        # Positions are written as they are read, so even the largest roll call is never held in memory at once
+        fields = {'status': None, 'results.votes.vote.congress': None, 'results.votes.vote.session': None}
+        with propublica.stream(api_url) as body:
+            positions = iter_json_items(body, "results.votes.vote.positions", fields)
+            first_position = next(positions, None)
+
+            # An ERROR status in a successful response means the roll call has no positions to store
+            if first_position is None:
+                print("No results found")
+                continue
+
+            vote = Vote(bill_id=bill.bill_id,
+                        chamber=result['chamber'],
+                        congress=fields['results.votes.vote.congress'],
+                        session=fields['results.votes.vote.session'],
+                        roll_call=result['roll_call'],
+                        question=result.get('question'),
+                        result=result.get('result'),
+                        vote_date=parse_date(result['date']),
+                        api_url=api_url,
                         )
-            bill_category = BillCategory(bill_id=bill_id, category_id=category.category_id)
-            db.session.add(bill_category)
-            db.session.add(bill)
+            db.session.add(vote)
+            db.session.flush()
+
+            for batch in iter_batches(chain([first_position], positions), INGEST_BATCH_SIZE):
+                db.session.bulk_insert_mappings(VotePosition, [{'vote_id': vote.vote_id,
+                                                                'congress_id': position['member_id'],
+                                                                'vote_position': position['vote_position']}
+                                                               for position in batch])
 
+    bill.refreshed_at = datetime.now()
     db.session.commit()
@@ -0,0 +1,114 @@
+import json
+import re
+from urllib.parse import urlparse, parse_qs
+from zlib import crc32
+
+from model.consts import HOUSE_URL
+
+# The House roster recorded from ProPublica, shipped with the repo
+MEMBERS_FIXTURE = "members.txt"
+
+BILL_URL = "https://api.propublica.org/congress/v1/115/bills/{slug}.json"
+VOTE_URL = "https://api.propublica.org/congress/v1/115/house/sessions/2/votes/{roll_call}.json"
+
+
+def get_recordings():
+    """Recorded responses shipped with the repo
+        :return {str: str}: path of the recorded JSON file keyed by url path
+    """
+
+    return {urlparse(HOUSE_URL).path: MEMBERS_FIXTURE}
+
+
+class SyntheticApi:
+    """Answers the ProPublica and Civic calls we have no recordings for with payloads shaped like the real ones
+
+    Everything is derived from the recorded House roster and a checksum of the url, so every run of the
+    benchmark sees exactly the same data.
+    """
+
+    def __init__(self, bills_per_subject=10, votes_per_bill=2, state="CA"):
+        """
+            :param bills_per_subject: int, bills listed for each subject
+            :param votes_per_bill: int, House roll calls held on each bill
+            :param state: str, state whose House member Civic returns for every address
+        """
+
+        with open(MEMBERS_FIXTURE) as file:
+            self.members = [member for member in json.load(file)['results'][0]['members'] if member['in_office']]
+
+        self.bills_per_subject = bills_per_subject
+        self.votes_per_bill = votes_per_bill
+        self.state = state
+
+    def __call__(self, url):
+        """Builds the payload for a url
+            :param url: str requested url
+            :return dict: JSON payload, or None if the url is not one we know how to answer
+        """
+
+        parsed = urlparse(url)
+
+        match = re.search(r"/bills/subjects/(?P<subject>[^/]+)\.json$", parsed.path)
+        if match:
+            return self.subject_bills(match.group("subject"))
+
+        match = re.search(r"/115/bills/(?P<slug>[a-z]+\d+)\.json$", parsed.path)
+        if match:
+            return self.bill_votes(match.group("slug"))
+
+        match = re.search(r"/votes/(?P<roll_call>\d+)\.json$", parsed.path)
+        if match:
+            return self.vote_positions(int(match.group("roll_call")))
+
+        if "civicinfo" in parsed.netloc + parsed.path:
+            return self.officials(parse_qs(parsed.query).get("address", [""])[0])
+
+    def subject_bills(self, subject):
+        """Payload of BILL_BY_CATEGORY_URL, neighbouring subjects share some of their bills"""
+
+        first = crc32(subject.encode("utf-8")) % 2000
+        bills = []
+        for number in range(first, first + self.bills_per_subject):
+            slug = f"hr{number}"
+            bills.append({'bill_id': f"{slug}-115",
+                          'short_title': f"{subject.replace('-', ' ')} Act of 2018, part {number}",
+                          'congressdotgov_url': f"https://www.congress.gov/bill/115th-congress/house-bill/{number}",
+                          'summary': f"To amend federal law concerning {subject.replace('-', ' ').lower()}.",
+                          'latest_major_action_date': f"2018-0{number % 9 + 1}-1{number % 10}",
+                          })
+        return {'status': "OK", 'results': bills}
+
+    def bill_votes(self, slug):
+        """Payload of ROLL_CALL_URL"""
+
+        number = int(re.sub(r"\D", "", slug))
+        votes = []
+        for offset in range(self.votes_per_bill):
+            roll_call = number * self.votes_per_bill + offset
+            votes.append({'chamber': "House",
+                          'date': f"2018-0{number % 9 + 1}-1{offset}",
+                          'roll_call': roll_call,
+                          'question': "On Passage",
+                          'result': "Passed",
+                          'api_url': VOTE_URL.format(roll_call=roll_call),
+                          })
+        return {'status': "OK", 'results': [{'bill_id': f"{slug}-115", 'votes': votes}]}
+
+    def vote_positions(self, roll_call):
+        """Payload of a vote's api_url"""
+
+        positions = [{'member_id': member['id'],
+                      'vote_position': "Yes" if crc32(f"{member['id']}{roll_call}".encode("utf-8")) % 3 else "No"}
+                     for member in self.members]
+        return {'status': "OK",
+                'results': {'votes': {'vote': {'congress': 115, 'session': 2, 'chamber': "House",
+                                               'roll_call': roll_call, 'positions': positions}}}}
+
+    def officials(self, address):
+        """Payload of REPRESENTATIVE_URL, officials for the address include people who are not in Congress"""
+
+        representative = next(member for member in self.members if member['state'] == self.state)
+        names = ["Donald J. Trump", "Mike Pence", "Edmund G. Brown Jr.",
+                 f"{representative['first_name']} {representative['last_name']}"]
+        return {'officials': [{'name': name} for name in names]}
@@ -0,0 +1,62 @@
+import json
+from io import BytesIO
+from threading import Lock
+from urllib.parse import urlparse
+from requests.adapters import BaseAdapter
+from requests.models import Response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Requests transport adapter that answers from recorded JSON instead of going over the network
+
+    Mount it on an ApiClient's session and every call made through that client is replayed. Recordings are
+    looked up by url path, anything without a recording is handed to the fallback, and anything the fallback
+    can't answer gets a ProPublica style error response.
+    """
+
+    def __init__(self, recordings=None, fallback=None):
+        """
+            :param recordings: {str: str} path of the recorded JSON file keyed by url path
+            :param fallback: callable taking a url and returning a JSON serializable payload, or None
+        """
+
+        super().__init__()
+        self.recordings = recordings or {}
+        self.fallback = fallback
+        self.calls = 0
+        self._lock = Lock()
+
+    def send(self, request, **kwargs):
+        """Builds the response a live api would have sent
+            :param request: PreparedRequest
+            :return Response
+        """
+
+        with self._lock:
+            self.calls += 1
+
+        path = urlparse(request.url).path
+        body = None
+        if path in self.recordings:
+            with open(self.recordings[path], "rb") as file:
+                body = file.read()
+        elif self.fallback:
+            payload = self.fallback(request.url)
+            if payload is not None:
+                body = json.dumps(payload).encode("utf-8")
+
+        response = Response()
+        response.status_code = 200 if body is not None else 404
+        if body is None:
+            body = json.dumps({'status': "ERROR", 'errors': [{'error': f"No recording for {path}"}]}).encode("utf-8")
+
+        response._content = body
+        response.raw = BytesIO(body)
+        response.headers['Content-Type'] = "application/json; charset=utf-8"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
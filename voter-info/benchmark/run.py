@@ -0,0 +1,253 @@
+"""End-to-end benchmark of the Flask routes against recorded api responses.
+
+Run from the voter-info directory, pointing it at a scratch database, which is dropped and re-created:
+
+    python -m benchmark.run --db postgresql:///voteinfo_bench
+
+Pass --explain plans.json to also write the query plan of every SELECT each route runs, which shows whether the
+routes are using the indexes added by the migrations in model/migrations.py.
+"""
+from argparse import ArgumentParser
+from os import environ
+from time import perf_counter
+from urllib.parse import urlencode
+import json
+
+# The app must be importable without live credentials
+environ.setdefault('FLASK_SECRET_KEY', 'benchmark')
+
+from sqlalchemy import event
+from model import db, connect_to_db, Bill, BillCategory, Category, User, RefreshJob
+from model.api_client import propublica, civic
+from model.consts import HOUSE_URL, FEED_PAGE_SIZE, MAX_BILLS_PER_REQUEST
+from api_request import load_bills_by_categories
+from seed import parse_members_from_json
+from worker import work_off_queue
+from server import app
+from benchmark.replay import ReplayAdapter
+from benchmark.fixtures import SyntheticApi, get_recordings
+
+BENCHMARK_ADDRESS = "1 Benchmark Way, Sacramento, CA 95814"
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the database, and keeps the SELECTs while recording is on"""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.recorded = None
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        if self.recorded is not None and statement.lstrip().upper().startswith("SELECT"):
+            self.recorded.append((statement, parameters))
+
+
+def explain(engine, statements):
+    """Asks the database how it would run each statement
+        :param engine: Engine the statements were run against
+        :param statements: [(str, tuple or dict)] statements and their parameters, as sent to the driver
+        :return [dict]: each distinct statement with its plan, one string per plan row
+    """
+
+    prefix = "EXPLAIN " if engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN "
+    plans = []
+    seen = set()
+
+    # Go through the driver so the parameters can be passed exactly as they were captured
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement, parameters in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            cursor.execute(prefix + statement, parameters)
+            plans.append({'statement': " ".join(statement.split()),
+                          'plan': [str(row[-1]) for row in cursor.fetchall()]})
+    finally:
+        connection.close()
+
+    return plans
+
+
+def mount_replay_adapter(fixture_api):
+    """Sends every outbound api call to recorded or synthetic responses
+        :param fixture_api: SyntheticApi answering calls without a recording
+        :return ReplayAdapter: mounted adapter, its calls attribute counts outbound requests
+    """
+
+    adapter = ReplayAdapter(get_recordings(), fixture_api)
+    for client in (propublica, civic):
+        client.session.mount("https://", adapter)
+        client.session.mount("http://", adapter)
+        # Recorded responses cost no quota, so seeding shouldn't wait on the rate limit
+        client.bucket = None
+    return adapter
+
+
+def seed_database(subject_count, followed_count, refreshed_count):
+    """Fills a fresh database through the normal ingest code paths
+        :param subject_count: int, subjects from subjects.txt to load bills for
+        :param followed_count: int, subjects the benchmark user follows
+        :param refreshed_count: int, bills whose roll calls are ingested before the run
+        :return User: user the logged in routes are driven as
+    """
+
+    db.drop_all()
+    db.create_all()
+
+    parse_members_from_json(propublica.get_json(HOUSE_URL))
+
+    with open("subjects.txt") as file:
+        categories = [Category(name=line) for line, _ in zip(file, range(subject_count))]
+    db.session.add_all(categories)
+    db.session.commit()
+
+    load_bills_by_categories(categories)
+
+    bill_ids = [bill_id for bill_id, in db.session.query(Bill.bill_id).order_by(Bill.bill_id).limit(refreshed_count)]
+    RefreshJob.enqueue({bill_id: 1 for bill_id in bill_ids})
+    work_off_queue()
+
+    user = User(screen_name="benchmark", email="benchmark@example.com", password="benchmark",
+                address=BENCHMARK_ADDRESS)
+    db.session.add(user)
+    db.session.commit()
+    user.add_user_categories(categories[:followed_count])
+
+    return user
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile
+        :param values: [float] samples
+        :param fraction: float between 0 and 1
+        :return float
+    """
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, url, iterations, queries, adapter, plans=None):
+    """Requests a url repeatedly, recording latency, queries and outbound api calls for each request
+        :param plans: dict, if given the query plans of the first request are stored in it under the url
+        :return dict: summary for the url
+    """
+
+    if plans is not None:
+        queries.recorded = []
+        client.get(url).get_data()
+        with app.app_context():
+            plans[url] = explain(db.engine, queries.recorded)
+        queries.recorded = None
+
+    latencies = []
+    query_counts = []
+    outbound_counts = []
+    for _ in range(iterations):
+        queries_before, outbound_before = queries.count, adapter.calls
+        start = perf_counter()
+        response = client.get(url)
+        # Streamed responses, such as exports, only run their queries as the body is read
+        response.get_data()
+        latencies.append((perf_counter() - start) * 1000)
+        query_counts.append(queries.count - queries_before)
+        outbound_counts.append(adapter.calls - outbound_before)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+
+    return {'route': url,
+            'requests': iterations,
+            'p50_ms': percentile(latencies, 0.5),
+            'p99_ms': percentile(latencies, 0.99),
+            'queries_per_request': sum(query_counts) / iterations,
+            'outbound_per_request': sum(outbound_counts) / iterations,
+            }
+
+
+def run(db_uri, iterations, subject_count, followed_count, refreshed_count, plans=None):
+    """Seeds the database and drives every GET route that reads the database
+        :param plans: dict, if given it is filled with the query plans of each route
+        :return [dict]: one summary per route
+    """
+
+    adapter = mount_replay_adapter(SyntheticApi())
+    connect_to_db(app, db_uri)
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        user = seed_database(subject_count, followed_count, refreshed_count)
+        user_id = user.user_id
+        category_id = Category.query.order_by(Category.category_id).first().category_id
+        bill_id = Bill.query.filter(Bill.refreshed_at.isnot(None)).order_by(Bill.bill_id).first().bill_id
+        category_bill_ids = [bill_id for bill_id, in db.session.query(BillCategory.bill_id)
+                             .filter(BillCategory.category_id == category_id)
+                             .order_by(BillCategory.bill_id)
+                             .limit(MAX_BILLS_PER_REQUEST)]
+        feed_bills, next_before = Bill.get_feed(user_id, None, FEED_PAGE_SIZE)
+        queries = QueryCounter(db.engine)
+
+    anonymous = app.test_client()
+    logged_in = app.test_client()
+    with logged_in.session_transaction() as session:
+        session['user_id'] = user_id
+
+    # Every GET route reading the database, user_categories exports need a token and are left out
+    routes = [(anonymous, "/congresspeople"),
+              (anonymous, "/api/congresspeople?chamber=Senate"),
+              (anonymous, "/api/suggest?q=war"),
+              (anonymous, f"/categories/{category_id}"),
+              (logged_in, "/categories"),
+              (anonymous, "/search?q=federal+law"),
+              (logged_in, f"/search?q=federal+law&category_id={category_id}"),
+              (logged_in, f"/bills/{bill_id}"),
+              (logged_in, "/api/bills?" + urlencode([('bill_id', bill_id) for bill_id in category_bill_ids])),
+              (logged_in, "/profile"),
+              (logged_in, "/user-categories"),
+              (logged_in, "/feed"),
+              (anonymous, "/export/bills"),
+              (anonymous, "/export/vote_positions?congress=115"),
+              ]
+    if next_before:
+        routes.append((logged_in, "/feed?" + urlencode({'before_date': next_before[0].strftime('%Y-%m-%d'),
+                                                         'before_bill': next_before[1]})))
+
+    return [measure(client, url, iterations, queries, adapter, plans) for client, url in routes]
+
+
+def print_report(results):
+    """Prints the summaries as a table"""
+
+    # Long urls, such as /api/bills with every bill_id, are cut short
+    width = min(max(len(result['route']) for result in results), 48) + 2
+    print(f"{'route':<{width}}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}{'outbound':>10}")
+    for result in results:
+        print(f"{result['route'][:width]:<{width}}{result['requests']:>10}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['queries_per_request']:>10.1f}{result['outbound_per_request']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the Flask routes against recorded api responses")
+    parser.add_argument("--db", default="postgresql:///voteinfo_bench",
+                        help="scratch database, all tables in it are dropped")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--subjects", type=int, default=40, help="subjects to load bills for")
+    parser.add_argument("--followed", type=int, default=10, help="subjects the benchmark user follows")
+    parser.add_argument("--refreshed", type=int, default=20, help="bills with roll calls ingested")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--explain", help="write the query plans of each route to this JSON file")
+    args = parser.parse_args()
+
+    plans = {} if args.explain else None
+    results = run(args.db, args.iterations, args.subjects, args.followed, args.refreshed, plans)
+    print_report(results)
+
+    if args.explain:
+        with open(args.explain, "w") as file:
+            json.dump(plans, file, indent=4)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
@@ -0,0 +1,41 @@
+from argparse import ArgumentParser
+from sys import stdout
+from model import connect_to_db
+from model.export import DATASETS, FORMATS, iter_csv, iter_arrow
+
+
+def export(dataset, file_format, output, congress=None):
+    """Writes a dataset to a file a chunk at a time, so exports of any size run in constant memory
+        :param dataset: str, key of DATASETS
+        :param file_format: str, "csv" or "arrow"
+        :param output: str, path to write to, or None for standard output
+        :param congress: int, only export this congress, for datasets that have one
+        :return None
+    """
+
+    chunks = iter_csv(dataset, congress) if file_format == "csv" else iter_arrow(dataset, congress)
+
+    if output is None:
+        sink = stdout if file_format == "csv" else stdout.buffer
+        for chunk in chunks:
+            sink.write(chunk)
+        return
+
+    with open(output, "w" if file_format == "csv" else "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+    print(f"Exported {dataset} to {output}")
+
+
+if __name__ == "__main__":
+    from server import app
+
+    parser = ArgumentParser(description="Export members, bills, subscriptions or vote positions")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", dest="file_format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--congress", type=int, help="only export this congress, for vote_positions")
+    parser.add_argument("--output", help="file to write, standard output if not given")
+    args = parser.parse_args()
+
+    connect_to_db(app)
+    export(args.dataset, args.file_format, args.output, args.congress)
@@ -0,0 +1,69 @@
+from argparse import ArgumentParser
+import csv
+from model import ZipDistrict, connect_to_db
+from model.consts import STATE_FIPS, AT_LARGE_DISTRICTS
+
+# Column names used by the Census ZCTA to congressional district relationship files and the HUD ZIP crosswalk
+ZCTA_COLUMNS = ("zcta", "zcta5", "zip", "geoid_zcta5_20")
+STATE_COLUMNS = ("state_abbr", "state", "state_fips")
+
+
+def parse_state(state):
+    """Reads a state from a district file, which gives either the abbreviation or the FIPS code
+        :param state: str such as "CA" or "06"
+        :return str: two letter state abbreviation, None if the code isn't a state or territory
+    """
+
+    if state.isdigit():
+        return STATE_FIPS.get(state.zfill(2))
+    return state.upper()
+
+
+def parse_district_rows(file):
+    """Reads ZCTA to congressional district pairs from a Census relationship file or HUD crosswalk
+        :param file: open text file, comma, tab or pipe delimited with a header row
+        :return set of (int, str, int): zcta, state and district, 0 for at-large seats
+    """
+
+    dialect = csv.Sniffer().sniff(file.readline(), delimiters=",\t|")
+    file.seek(0)
+    reader = csv.DictReader(file, dialect=dialect)
+    columns = {column.strip().lower(): column for column in reader.fieldnames}
+
+    zcta_column = next(columns[name] for name in ZCTA_COLUMNS if name in columns)
+    district_column = next(column for name, column in columns.items()
+                           if name.startswith("cd") or name.startswith("geoid_cd"))
+    state_column = next((columns[name] for name in STATE_COLUMNS if name in columns), None)
+
+    rows = set()
+    for row in reader:
+        zcta, district = row[zcta_column].strip(), row[district_column].strip()
+
+        # Without a state column the district is a GEOID, the state's FIPS code followed by the district
+        if state_column:
+            state = parse_state(row[state_column].strip())
+        else:
+            state, district = parse_state(district[:2]), district[2:]
+
+        # Water and unassigned areas have districts like "ZZ"
+        if not state or not zcta.isdigit() or not district.isdigit():
+            continue
+
+        district = int(district)
+        rows.add((int(zcta), state, 0 if district in AT_LARGE_DISTRICTS else district))
+
+    return rows
+
+
+if __name__ == "__main__":
+    from server import app
+
+    parser = ArgumentParser(description="Import which congressional districts each ZIP code lies in, so "
+                                        "representatives can be found without the Civic api")
+    parser.add_argument("path", help="Census ZCTA to congressional district relationship file or HUD ZIP crosswalk")
+    args = parser.parse_args()
+
+    connect_to_db(app)
+    with open(args.path, newline="") as file:
+        rows = parse_district_rows(file)
+    print(f"{ZipDistrict.replace_all(sorted(rows))} ZIP code districts imported")
@@ -0,0 +1,10 @@
+from model import connect_to_db
+from model.migrations import migrate
+
+
+if __name__ == "__main__":
+    from server import app
+
+    connect_to_db(app)
+    applied = migrate()
+    print(f"{len(applied)} migrations applied")
@@ -5,3 +5,8 @@ from .congressperson import Congressperson
 from .bill import Bill
 from .user_category import UserCategory
 from .bill_category import BillCategory
+from .vote import Vote, VotePosition
+from .address_lookup import AddressLookup
+from .sync_checkpoint import SyncCheckpoint
+from .refresh_job import RefreshJob
+from .zip_district import ZipDistrict
@@ -0,0 +1,74 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from .db import db
+from .consts import REPRESENTATIVE_CACHE_TTL
+from .congressperson import Congressperson
+
+
+class AddressLookup(db.Model):
+    """Cached Google Civic lookup of the congresspeople representing an address for Voter Info Project
+
+    Lookups are keyed by normalized address, so users sharing an address share one lookup and a user whose
+    address changes no longer matches their old lookup.
+    """
+
+    __tablename__ = "address_lookups"
+
+    address_lookup_id = db.Column(db.Integer, autoincrement=True, primary_key=True)
+    normalized_address = db.Column(db.String, unique=True, nullable=False)
+    congress_ids = db.Column(db.String, nullable=False, default="")
+    looked_up_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<normalized_address={self.normalized_address}, congress_ids={self.congress_ids}>'
+
+    def is_fresh(self):
+        """Checks whether the lookup is still inside its time to live
+            :return bool: True if the lookup can be used without asking Civic again
+        """
+
+        return datetime.now() - self.looked_up_at < REPRESENTATIVE_CACHE_TTL
+
+    def get_congresspeople(self):
+        """Gets the congresspeople this lookup resolved to
+            :return [Congressperson]: congresspeople representing the address
+        """
+
+        congress_ids = [congress_id for congress_id in self.congress_ids.split(",") if congress_id]
+        if not congress_ids:
+            return []
+
+        return Congressperson.query.filter(Congressperson.congress_id.in_(congress_ids)).all()
+
+    @classmethod
+    def get_fresh(cls, normalized_address):
+        """Gets the cached lookup for an address if it has not expired
+            :param normalized_address: str, address run through helpers.normalize_address
+            :return AddressLookup: fresh lookup, or None if Civic has to be asked
+        """
+
+        lookup = cls.query.filter_by(normalized_address=normalized_address).first()
+        if lookup and lookup.is_fresh():
+            return lookup
+
+    @classmethod
+    def store(cls, normalized_address, congresspeople):
+        """Saves the congresspeople found for an address, replacing any expired lookup
+            :param normalized_address: str, address run through helpers.normalize_address
+            :param congresspeople: [Congressperson] found for the address
+            :return None: updates database with the lookup
+        """
+
+        lookup = cls.query.filter_by(normalized_address=normalized_address).first()
+        if lookup is None:
+            lookup = cls(normalized_address=normalized_address)
+            db.session.add(lookup)
+
+        lookup.congress_ids = ",".join(member.congress_id for member in congresspeople)
+        lookup.looked_up_at = datetime.now()
+
+        # Another request may have stored the same address first, in which case its lookup is just as good
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
@@ -0,0 +1,242 @@
+from threading import Lock
+import numpy as np
+from sqlalchemy import func
+from .db import db
+from .congressperson import Congressperson
+from .vote import Vote, VotePosition
+from .bill_category import BillCategory
+from .cache import LRUCache
+from .metrics import register_cache
+from .consts import ANALYTICS_CACHE_TTL
+
+# Positions that count as taking a side, anything else such as "Not Voting" or "Present" is an abstention
+POSITION_VALUES = {'Yes': 1, 'No': -1}
+
+
+def build_position_matrix(member_ids, vote_ids, position_members, position_votes, position_values):
+    """Lays stored vote positions out as a members x roll calls matrix
+        :param member_ids: np.ndarray of sorted congress_ids, one per row
+        :param vote_ids: np.ndarray of sorted vote_ids, one per column
+        :param position_members: np.ndarray congress_id of each position
+        :param position_votes: np.ndarray vote_id of each position
+        :param position_values: np.ndarray 1 for Yes, -1 for No and 0 otherwise, for each position
+        :return np.ndarray: int8 matrix, 0 where a member did not vote or has no stored position
+    """
+
+    matrix = np.zeros((len(member_ids), len(vote_ids)), dtype=np.int8)
+
+    # Positions of people no longer in the roster are dropped
+    rows = np.searchsorted(member_ids, position_members).clip(max=max(len(member_ids) - 1, 0))
+    known = member_ids[rows] == position_members if len(member_ids) else np.zeros(len(rows), dtype=bool)
+    columns = np.searchsorted(vote_ids, position_votes)
+
+    matrix[rows[known], columns[known]] = position_values[known]
+    return matrix
+
+
+def get_party_majorities(matrix, party_index, party_count):
+    """Finds the side most of each party took on each roll call
+        :param matrix: np.ndarray members x roll calls positions
+        :param party_index: np.ndarray party of each member, as an index into the parties
+        :param party_count: int, number of parties
+        :return np.ndarray: parties x roll calls, 1 or -1 for the majority side, 0 for a tie or nobody voting
+    """
+
+    membership = np.zeros((party_count, len(party_index)))
+    membership[party_index, np.arange(len(party_index))] = 1
+    return np.sign(membership @ matrix)
+
+
+def get_party_unity(matrix, party_index, party_count):
+    """Share of each member's votes cast with the majority of their own party
+        :return np.ndarray: percentage per member, nan for members who never voted against a party line
+    """
+
+    majorities = get_party_majorities(matrix, party_index, party_count)[party_index]
+    counted = (matrix != 0) & (majorities != 0)
+    with_party = counted & (matrix == majorities)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * with_party.sum(axis=1) / counted.sum(axis=1)
+
+
+def get_pairwise_agreement(matrix):
+    """Share of roll calls two members took the same side on, out of those both voted on
+        :return np.ndarray: members x members percentages, nan for pairs who never both voted
+    """
+
+    yes = (matrix == 1).astype(np.float32)
+    no = (matrix == -1).astype(np.float32)
+    voted = yes + no
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * (yes @ yes.T + no @ no.T) / (voted @ voted.T)
+
+
+def get_category_totals(matrix, incidence):
+    """Counts each member's Yes and No votes on the bills of each category
+        :param matrix: np.ndarray members x roll calls positions
+        :param incidence: np.ndarray roll calls x categories, 1 where the roll call's bill is in the category
+        :return (np.ndarray, np.ndarray): members x categories Yes counts and No counts
+    """
+
+    return (matrix == 1).astype(np.float32) @ incidence, (matrix == -1).astype(np.float32) @ incidence
+
+
+class ChamberAnalytics:
+    """Party unity, member agreement and per category records for one chamber, computed from stored roll calls"""
+
+    def __init__(self, member_ids, parties, vote_ids, position_members, position_votes, position_values,
+                 link_votes, link_categories):
+        """
+            :param member_ids: [str] congress_ids of the chamber's members
+            :param parties: [str] party of each member
+            :param vote_ids: [int] vote_ids of the chamber's roll calls
+            :param position_members, position_votes, position_values: columns of the stored vote positions
+            :param link_votes, link_categories: columns pairing each roll call with the categories of its bill
+        """
+
+        order = np.argsort(member_ids)
+        self.member_ids = np.asarray(member_ids, dtype=str)[order]
+        self.vote_ids = np.unique(np.asarray(vote_ids, dtype=np.int64))
+        self._rows = {congress_id: row for row, congress_id in enumerate(self.member_ids)}
+
+        self.matrix = build_position_matrix(self.member_ids, self.vote_ids,
+                                            np.asarray(position_members, dtype=str),
+                                            np.asarray(position_votes, dtype=np.int64),
+                                            np.asarray(position_values, dtype=np.int8))
+
+        party_names, party_index = np.unique(np.asarray(parties, dtype=str)[order], return_inverse=True)
+        self.party_unity = get_party_unity(self.matrix, party_index, len(party_names))
+        self.agreement = get_pairwise_agreement(self.matrix)
+
+        self.category_ids, category_columns = np.unique(np.asarray(link_categories, dtype=np.int64),
+                                                        return_inverse=True)
+        incidence = np.zeros((len(self.vote_ids), len(self.category_ids)), dtype=np.float32)
+        incidence[np.searchsorted(self.vote_ids, np.asarray(link_votes, dtype=np.int64)), category_columns] = 1
+        self.category_yes, self.category_no = get_category_totals(self.matrix, incidence)
+
+    @classmethod
+    def build(cls, chamber):
+        """Loads a chamber's members, roll calls and positions and computes everything in vectorized passes
+            :param chamber: str, "House" or "Senate"
+            :return ChamberAnalytics
+        """
+
+        members = (db.session.query(Congressperson.congress_id, Congressperson.party)
+                   .filter(Congressperson.chamber == chamber).all())
+        vote_ids = [vote_id for vote_id, in db.session.query(Vote.vote_id).filter(Vote.chamber == chamber)]
+        positions = (db.session.query(VotePosition.congress_id, VotePosition.vote_id, VotePosition.vote_position)
+                     .join(Vote).filter(Vote.chamber == chamber).all())
+        links = (db.session.query(Vote.vote_id, BillCategory.category_id)
+                 .join(BillCategory, BillCategory.bill_id == Vote.bill_id)
+                 .filter(Vote.chamber == chamber).all())
+
+        return cls([congress_id for congress_id, party in members],
+                   [party for congress_id, party in members],
+                   vote_ids,
+                   [congress_id for congress_id, vote_id, position in positions],
+                   [vote_id for congress_id, vote_id, position in positions],
+                   [POSITION_VALUES.get(position, 0) for congress_id, vote_id, position in positions],
+                   [vote_id for vote_id, category_id in links],
+                   [category_id for vote_id, category_id in links])
+
+    def get_party_unity(self, congress_id):
+        """Gets how often a member voted with their party
+            :param congress_id: str
+            :return float: percentage, or None if they aren't in the chamber or never voted on a party line
+        """
+
+        row = self._rows.get(congress_id)
+        if row is None or np.isnan(self.party_unity[row]):
+            return None
+        return round(float(self.party_unity[row]), 1)
+
+    def get_agreement(self, congress_id, other_id):
+        """Gets how often two members of the chamber voted the same way
+            :param congress_id: str
+            :param other_id: str
+            :return float: percentage, or None if they never both voted
+        """
+
+        row, other_row = self._rows.get(congress_id), self._rows.get(other_id)
+        if row is None or other_row is None or np.isnan(self.agreement[row, other_row]):
+            return None
+        return round(float(self.agreement[row, other_row]), 1)
+
+    def get_category_record(self, congress_id, category_ids):
+        """Counts a member's Yes and No votes on bills in each of the given categories
+            :param congress_id: str
+            :param category_ids: [int] categories you want, ones the member never voted on are left out
+            :return {int: (int, int)}: Yes and No counts keyed by category_id
+        """
+
+        row = self._rows.get(congress_id)
+        if row is None:
+            return {}
+
+        columns = np.searchsorted(self.category_ids, category_ids)
+        record = {}
+        for category_id, column in zip(category_ids, columns):
+            if column < len(self.category_ids) and self.category_ids[column] == category_id:
+                yes, no = int(self.category_yes[row, column]), int(self.category_no[row, column])
+                if yes or no:
+                    record[category_id] = (yes, no)
+        return record
+
+
+# Analytics keyed by chamber and the newest stored roll call, so a new roll call means a recompute
+analytics_cache = LRUCache(4, ANALYTICS_CACHE_TTL)
+register_cache("analytics", analytics_cache)
+analytics_lock = Lock()
+
+
+def get_chamber_analytics(chamber):
+    """Gets a chamber's analytics, computing them if roll calls have been stored since they were last computed
+        :param chamber: str, "House" or "Senate"
+        :return ChamberAnalytics
+    """
+
+    key = (chamber, db.session.query(func.max(Vote.vote_id)).scalar())
+    analytics = analytics_cache.get(key)
+
+    if analytics is None:
+        # One request computes while the others wait for its result
+        with analytics_lock:
+            analytics = analytics_cache.get(key)
+            if analytics is None:
+                analytics = ChamberAnalytics.build(chamber)
+                analytics_cache.set(key, analytics)
+
+    return analytics
+
+
+def get_member_stats(congresspeople, categories):
+    """Gathers the charts shown for a group of congresspeople, such as a user's representatives
+        :param congresspeople: [Congressperson]
+        :param categories: [Category] categories to show each member's record in
+        :return {str: dict}: keyed by congress_id, party_unity percentage (ProPublica's figure if we have no roll
+            calls for them yet), agreement with each other member of the same chamber, and Yes and No counts by
+            category name
+    """
+
+    analytics = {chamber: get_chamber_analytics(chamber)
+                 for chamber in {member.get_chamber() for member in congresspeople}}
+    category_names = {category.category_id: category.name.strip() for category in categories}
+
+    stats = {}
+    for member in congresspeople:
+        chamber_analytics = analytics[member.get_chamber()]
+        party_unity = chamber_analytics.get_party_unity(member.congress_id)
+        record = chamber_analytics.get_category_record(member.congress_id, list(category_names))
+
+        stats[member.congress_id] = {
+            'party_unity': party_unity if party_unity is not None else member.votes_with_party_pct,
+            'agreement': [{'name': other.name,
+                           'pct': chamber_analytics.get_agreement(member.congress_id, other.congress_id)}
+                          for other in congresspeople
+                          if other is not member and other.get_chamber() == member.get_chamber()],
+            'categories': [{'name': category_names[category_id], 'yes': yes, 'no': no}
+                           for category_id, (yes, no) in record.items()],
+        }
+    return stats
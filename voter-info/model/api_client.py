@@ -0,0 +1,302 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from hashlib import sha256
+from os import path
+from random import uniform
+from threading import Lock
+from time import perf_counter, sleep, time
+import fcntl
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from .consts import (PROPUBLICA_KEY, INGEST_CONCURRENCY, REQUEST_TIMEOUT, API_RATE_LIMIT, API_BURST,
+                     BACKGROUND_RESERVE, RATE_LIMIT_DIR, MAX_RETRIES, RETRY_BACKOFF,
+                     INTERACTIVE_MAX_RETRY_WAIT, BACKGROUND_MAX_RETRY_WAIT)
+from .metrics import api_request_seconds, api_requests, api_response_bytes, api_coalesced_requests, get_endpoint
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class TokenBucket:
+    """Token bucket rate limit, optionally kept in a file so every process on the machine shares one bucket"""
+
+    def __init__(self, rate, capacity, state_path=None):
+        """
+            :param rate: float, tokens added per second
+            :param capacity: float, most tokens the bucket holds, which is the largest burst allowed
+            :param state_path: str, file holding the bucket's state, or None to keep it in this process
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.state_path = state_path
+        self._tokens = capacity
+        self._updated_at = time()
+        self._lock = Lock()
+
+    def acquire(self, reserve=0):
+        """Waits until a token can be taken without dropping below reserve, then takes it
+            :param reserve: float, tokens to leave for callers with a higher priority
+            :return None
+        """
+
+        wait = self._take(reserve)
+        while wait > 0:
+            sleep(wait)
+            wait = self._take(reserve)
+
+    def _take(self, reserve):
+        """Takes a token if there is one to spare
+            :return float: 0 if a token was taken, otherwise seconds until there should be one
+        """
+
+        with self._lock:
+            if self.state_path is None:
+                return self._refill_and_take(reserve)
+
+            with open(self.state_path, "a+") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                file.seek(0)
+                try:
+                    self._tokens, self._updated_at = json.load(file)
+                except ValueError:
+                    self._tokens, self._updated_at = self.capacity, time()
+
+                wait = self._refill_and_take(reserve)
+
+                file.seek(0)
+                file.truncate()
+                json.dump([self._tokens, self._updated_at], file)
+                return wait
+
+    def _refill_and_take(self, reserve):
+        """Adds the tokens earned since the last update, then takes one if there is one to spare
+            :return float: 0 if a token was taken, otherwise seconds until there should be one
+        """
+
+        now = time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        if self._tokens >= 1 + reserve:
+            self._tokens -= 1
+            return 0
+        return (1 + reserve - self._tokens) / self.rate
+
+
+class BodyReader:
+    """File-like view of a streamed response body that hashes and counts the bytes read through it"""
+
+    def __init__(self, raw):
+        """
+            :param raw: file-like body of a response sent with stream=True
+        """
+
+        self.raw = raw
+        self.size = 0
+        self._hash = sha256()
+
+    def read(self, size=-1):
+        chunk = self.raw.read(size)
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        """Hash of everything read so far, the same as hashing the whole body once it has all been read
+            :return str: sha256 hex digest
+        """
+
+        return self._hash.hexdigest()
+
+
+class ApiClient:
+    """Keep-alive HTTP client shared by everything that calls an external api
+
+    Requests are rate limited with a token bucket, throttled and failed requests are retried with jittered backoff,
+    and concurrent requests for the same url share one fetch. Every request it sends is recorded in the metrics
+    served on /metrics.
+    """
+
+    def __init__(self, name, headers=None, pool_size=INGEST_CONCURRENCY, bucket=None):
+        """
+            :param name: str, names the api in metrics
+            :param headers: dict of headers sent with every request, such as api keys
+            :param pool_size: int, most connections kept open to a single host
+            :param bucket: TokenBucket limiting the request rate, or None for no limit
+        """
+
+        self.name = name
+        self.bucket = bucket
+        self.priority = INTERACTIVE
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._in_flight = {}
+        self._in_flight_lock = Lock()
+
+    def get(self, url):
+        """Sends a GET request, or waits for the same request another thread already has in flight
+            :param url: str
+            :return Response
+        """
+
+        with self._in_flight_lock:
+            future = self._in_flight.get(url)
+            leader = future is None
+            if leader:
+                future = self._in_flight[url] = Future()
+
+        if not leader:
+            api_coalesced_requests.inc((self.name, get_endpoint(url)))
+            return future.result()
+
+        # Whatever happens, threads waiting on this fetch get the same response or error
+        try:
+            future.set_result(self._get_with_retries(url))
+        except Exception as error:
+            future.set_exception(error)
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[url]
+
+        return future.result()
+
+    @contextmanager
+    def stream(self, url):
+        """Sends a GET request without reading the body, for payloads too big to hold in memory at once
+
+        Not coalesced with other requests for the same url, since a body can only be read once. Its latency is the
+        time until the headers arrived.
+
+            :param url: str
+            :return BodyReader: to read the body from, for example with helpers.iter_json_items
+            :raises requests.HTTPError: if the api answered with an error status, even after retries
+        """
+
+        response = self._get_with_retries(url, stream=True)
+        body = BodyReader(response.raw)
+        try:
+            response.raise_for_status()
+            yield body
+        finally:
+            response.close()
+            api_response_bytes.inc((self.name, get_endpoint(url)), body.size)
+
+    def _get_with_retries(self, url, stream=False):
+        """Sends a GET request, retrying throttled and server error responses after a jittered backoff
+            :param url: str
+            :param stream: bool, leave the body of the response unread
+            :return Response: last response received, even if every attempt was an error
+        """
+
+        max_wait = BACKGROUND_MAX_RETRY_WAIT if self.priority == BACKGROUND else INTERACTIVE_MAX_RETRY_WAIT
+
+        for attempt in range(MAX_RETRIES + 1):
+            response = self._send(url, stream)
+            if response.status_code != 429 and response.status_code < 500 or attempt == MAX_RETRIES:
+                return response
+
+            # Honour the api asking us to slow down, otherwise back off randomly so retries don't line up
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            if delay > max_wait:
+                print(f"{url} returned {response.status_code}, not waiting {delay:.0f}s to retry")
+                return response
+
+            response.close()
+            print(f"{url} returned {response.status_code}, retrying in {delay:.1f}s")
+            sleep(delay)
+
+    def _send(self, url, stream=False):
+        """Sends one GET request once the rate limit allows it, recording its latency, status and size
+            :param url: str
+            :param stream: bool, leave the body unread, its size is then recorded by stream
+            :return Response
+        """
+
+        if self.bucket is not None:
+            self.bucket.acquire(BACKGROUND_RESERVE if self.priority == BACKGROUND else 0)
+
+        endpoint = get_endpoint(url)
+        start = perf_counter()
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT, stream=stream)
+        except requests.RequestException:
+            api_requests.inc((self.name, endpoint, "error"))
+            raise
+
+        if stream:
+            # Let the body be read straight off the socket, un-gzipped on the way
+            response.raw.decode_content = True
+        else:
+            # Reading content here means the latency includes downloading the body, not just the headers
+            api_response_bytes.inc((self.name, endpoint), len(response.content))
+
+        api_request_seconds.observe((self.name, endpoint), perf_counter() - start)
+        api_requests.inc((self.name, endpoint, str(response.status_code)))
+        return response
+
+    def get_json(self, url):
+        """Sends a GET request and decodes the JSON body
+            :param url: str
+            :return dict: decoded response
+            :raises requests.HTTPError: if the api answered with an error status, even after retries
+        """
+
+        response = self.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def get_many(self, urls, concurrency=INGEST_CONCURRENCY):
+        """Fetches many urls in parallel, handing the responses back in the order the urls were given
+
+        Only the downloads run on worker threads, the caller consumes the responses on its own thread so it can
+        safely write them to the database as they arrive.
+
+            :param urls: [str] urls to fetch
+            :param concurrency: int, most requests in flight at once
+            :return generator of (str, Response): url with its response, or None if the request failed
+        """
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            yield from zip(urls, executor.map(self._get_or_none, urls))
+
+    def _get_or_none(self, url):
+        """Sends a GET request, printing and swallowing connection errors so one bad url doesn't stop a batch
+            :param url: str
+            :return Response: or None if the request failed
+        """
+
+        try:
+            return self.get(url)
+        except requests.RequestException as error:
+            print(f"Request to {url} failed: {error}")
+
+
+def get_bucket(name):
+    """Makes the rate limit for one api, shared through RATE_LIMIT_DIR if it is set
+        :param name: str, api name, which also names its state file
+        :return TokenBucket
+    """
+
+    state_path = path.join(RATE_LIMIT_DIR, f"{name}.bucket") if RATE_LIMIT_DIR else None
+    return TokenBucket(API_RATE_LIMIT, API_BURST, state_path)
+
+
+def use_background_priority():
+    """Marks this process as a background job, whose requests wait whenever pages might need the rate limit
+        :return None
+    """
+
+    propublica.priority = BACKGROUND
+    civic.priority = BACKGROUND
+
+
+propublica = ApiClient("propublica", headers={'X-API-Key': PROPUBLICA_KEY}, bucket=get_bucket("propublica"))
+civic = ApiClient("civic", bucket=get_bucket("civic"))
@@ -1,13 +1,16 @@
+from datetime import datetime
+from sqlalchemy import and_, or_, func, distinct, event, tuple_, DDL
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from .db import db
-from .consts import ROLL_CALL_URL, PROPUBLICA_KEY
+from .consts import BILL_REFRESH_INTERVAL, BILL_ACTIVE_WINDOW, FEED_PAGE_SIZE
 from .category import Category
-import requests
 
 
 class Bill(db.Model):
     """Bill for Voter Info Project"""
 
     __tablename__ = "bills"
+    __table_args__ = (db.Index("ix_bills_latest_action_date_bill", "latest_action_date", "bill_id"),)
 
     bill_id = db.Column(db.String,
                         unique=True,
@@ -16,10 +19,15 @@ class Bill(db.Model):
     bill_title = db.Column(db.String)
     bill_uri = db.Column(db.String, unique=True, nullable=False)
     summary = db.Column(db.String)
-    house_roll_call = None
-    senate_roll_call = None
-    house_votes_url = None
-    senate_votes_url = None
+    latest_action_date = db.Column(db.DateTime)
+    house_roll_call = db.Column(db.Integer)
+    senate_roll_call = db.Column(db.Integer)
+    house_votes_url = db.Column(db.String)
+    senate_votes_url = db.Column(db.String)
+    refreshed_at = db.Column(db.DateTime, index=True)
+
+    # Weighted title and summary words, kept up to date by a trigger on Postgres, unused on other databases
+    search_vector = db.deferred(db.Column(db.String().with_variant(TSVECTOR(), "postgresql")))
 
     def get_bill_slug(self):
         """Formats bill_id into bill slug
@@ -29,6 +37,29 @@ class Bill(db.Model):
         return self.bill_id.split("-")[0]
 
 
+    @classmethod
+    def get_stale_bills(cls):
+        """Gets bills whose roll call info needs refreshing, with how many users follow each of them
+
+        A bill is stale if it was never refreshed, which ingest also resets whenever a bill has new action, or if
+        it saw action recently and has not been refreshed for BILL_REFRESH_INTERVAL, in case a vote was held on
+        the same day it was last refreshed.
+
+            :return [(str, int)]: bill_id and number of followers for each stale bill
+        """
+        from . import BillCategory, UserCategory
+
+        cutoff = datetime.now() - BILL_REFRESH_INTERVAL
+        stale = or_(cls.refreshed_at.is_(None),
+                    and_(cls.refreshed_at < cutoff, cls.latest_action_date >= cutoff - BILL_ACTIVE_WINDOW))
+
+        return (db.session.query(cls.bill_id, func.count(distinct(UserCategory.user_id)))
+                .outerjoin(BillCategory, BillCategory.bill_id == cls.bill_id)
+                .outerjoin(UserCategory, UserCategory.category_id == BillCategory.category_id)
+                .filter(stale)
+                .group_by(cls.bill_id)
+                .all())
+
     @classmethod
     def retrieve_bills_by_category(cls, category):
         """Gets bills associated with category from database
@@ -43,29 +74,36 @@ class Bill(db.Model):
 
         return Bill.query.join(BillCategory).filter_by(category_id=category.category_id).all()
 
-    def set_roll_call_info(self):
-        """Sets roll call data so we can look up how politicians voted
-            :return None: sets bill's roll call info
-        """
+    @classmethod
+    def get_feed(cls, user_id, before=None, limit=FEED_PAGE_SIZE):
+        """Gets the most recently acted on bills across every category a user follows, newest first
 
-        # Create bill slug, then use it to call ProPublica api
-        bill_slug = self.get_bill_slug()
-        search_url = ROLL_CALL_URL.replace("{bill-id}", bill_slug)
-        print(search_url)
+        Bills are walked in (latest_action_date, bill_id) order through an index and each one is kept if any of its
+        categories is followed, so the cost of a page doesn't grow with how many categories the user follows and a
+        bill in several followed categories only shows up once. Bills that have never seen action are left out.
 
-        fill_bill_request = requests.get(search_url, headers={'X-API-Key': PROPUBLICA_KEY})
-        print(fill_bill_request.text)
+            :param user_id: int, user whose feed you want
+            :param before: (datetime, str) latest_action_date and bill_id of the last bill on the previous page
+            :param limit: int, most bills returned
+            :return ([Bill], (datetime, str)): page of bills and the before value of the next page, None on the last
+        """
+        from . import BillCategory, UserCategory
 
-        bill_json = fill_bill_request.json()
+        followed = (db.session.query(BillCategory.bill_category_id)
+                    .join(UserCategory, UserCategory.category_id == BillCategory.category_id)
+                    .filter(BillCategory.bill_id == cls.bill_id, UserCategory.user_id == user_id))
 
-        # Check to make sure there is no error in information received, then parse the info
-        if bill_json.get('error') or bill_json.get('errors') or bill_json.get('status') == "ERROR":
-            print("No results found")
+        query = cls.query.filter(cls.latest_action_date.isnot(None), followed.exists())
+        if before:
+            query = query.filter(tuple_(cls.latest_action_date, cls.bill_id) < tuple_(*before))
 
-        else:
-            results = bill_json['results'][0]['votes']
-            if results:
-                self.parse_roll_call_info(results)
+        # One extra row tells us whether there is a next page without counting the whole feed
+        bills = query.order_by(cls.latest_action_date.desc(), cls.bill_id.desc()).limit(limit + 1).all()
+        if len(bills) <= limit:
+            return bills, None
+
+        last = bills[limit - 1]
+        return bills[:limit], (last.latest_action_date, last.bill_id)
 
     def parse_roll_call_info(self, json_results):
         """Takes a bill json and checks for roll call info.
@@ -86,3 +124,23 @@ class Bill(db.Model):
                 self.senate_roll_call = result['roll_call']
                 self.senate_votes_url = result['api_url']
                 break
+
+
+# Postgres fills search_vector itself whenever a bill's title or summary is written, and searches it through a GIN
+# index, these statements run when the table is created and again from model/migrations.py for existing databases
+SEARCH_VECTOR_DDL = [
+    """CREATE OR REPLACE FUNCTION bills_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := setweight(to_tsvector('pg_catalog.english', coalesce(NEW.bill_title, '')), 'A') ||
+                             setweight(to_tsvector('pg_catalog.english', coalesce(NEW.summary, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    """DROP TRIGGER IF EXISTS bills_search_vector_trigger ON bills""",
+    """CREATE TRIGGER bills_search_vector_trigger BEFORE INSERT OR UPDATE OF bill_title, summary ON bills
+    FOR EACH ROW EXECUTE PROCEDURE bills_search_vector_update()""",
+    """CREATE INDEX IF NOT EXISTS ix_bills_search_vector ON bills USING gin(search_vector)""",
+]
+
+for statement in SEARCH_VECTOR_DDL:
+    event.listen(Bill.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -7,6 +7,8 @@ class BillCategory(db.Model):
     """BillCategory for Voter Info Project"""
 
     __tablename__ = "bill_categories"
+    __table_args__ = (db.UniqueConstraint("bill_id", "category_id", name="uq_bill_categories_bill_category"),
+                      db.Index("ix_bill_categories_category_bill", "category_id", "bill_id"))
 
     bill_category_id = db.Column(db.Integer, autoincrement=True, primary_key=True)
 
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from math import log
+from threading import Lock
+from time import monotonic
+from sqlalchemy import func
+from .db import db
+from .bill import Bill
+from .bill_category import BillCategory
+from .sync_checkpoint import SyncCheckpoint
+from .consts import INDEX_REFRESH_SECONDS
+from .helpers import normalize_search_text
+
+# How much more a word in the title counts than a word in the summary
+TITLE_WEIGHT = 2
+
+
+def search_bills(query, category_id=None, page=1, per_page=20):
+    """Finds bills whose title or summary contain every word of the query, best matches first
+        :param query: str keywords typed by the user
+        :param category_id: int, only return bills in this category
+        :param page: int, page of results starting at 1
+        :param per_page: int, bills per page
+        :return ([Bill], int): bills on the page, and how many bills matched in total
+    """
+
+    if db.engine.dialect.name == "postgresql":
+        return search_bills_postgres(query, category_id, page, per_page)
+    return bill_search_index.search(query, category_id, page, per_page)
+
+
+def search_bills_postgres(query, category_id, page, per_page):
+    """Searches the GIN indexed search_vector column, ranked with ts_rank_cd"""
+
+    ts_query = func.plainto_tsquery('pg_catalog.english', query)
+    matches = Bill.query.filter(Bill.search_vector.op('@@')(ts_query))
+
+    if category_id:
+        in_category = db.session.query(BillCategory.bill_id).filter(BillCategory.category_id == category_id)
+        matches = matches.filter(Bill.bill_id.in_(in_category))
+
+    rank = func.ts_rank_cd(Bill.search_vector, ts_query)
+    results = (matches.order_by(rank.desc(), Bill.latest_action_date.desc().nullslast(), Bill.bill_id)
+               .paginate(page, per_page, error_out=False))
+    return results.items, results.total
+
+
+class BillSearchIndex:
+    """In-memory inverted index over bill titles and summaries, used when the database is not Postgres"""
+
+    def __init__(self):
+        self._postings = {}
+        self._bill_count = 0
+        self._built_for = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    def build(self, bills):
+        """Replaces the index
+            :param bills: [(str, str, str)] bill_id, title and summary of every bill
+            :return None
+        """
+
+        postings = defaultdict(lambda: defaultdict(int))
+        bill_count = 0
+        for bill_id, title, summary in bills:
+            bill_count += 1
+            for word in normalize_search_text(title or "").split():
+                postings[word][bill_id] += TITLE_WEIGHT
+            for word in normalize_search_text(summary or "").split():
+                postings[word][bill_id] += 1
+
+        self._postings = {word: dict(bill_weights) for word, bill_weights in postings.items()}
+        self._bill_count = bill_count
+
+    def refresh_if_stale(self):
+        """Builds the index if it was never built, or rebuilds it if sync.py has run since it was built
+            :return None
+        """
+
+        if self._checked_at is not None and monotonic() - self._checked_at < INDEX_REFRESH_SECONDS:
+            return
+
+        with self._lock:
+            self._checked_at = monotonic()
+            last_sync = SyncCheckpoint.get_last_sync()
+            if not self._postings or last_sync != self._built_for:
+                self.build(db.session.query(Bill.bill_id, Bill.bill_title, Bill.summary))
+                self._built_for = last_sync
+
+    def search(self, query, category_id, page, per_page):
+        """Ranks bills containing every word of the query by summed tf-idf
+            :return ([Bill], int): bills on the page, and how many bills matched in total
+        """
+
+        self.refresh_if_stale()
+
+        words = normalize_search_text(query).split()
+        postings = self._postings
+        if not words or any(word not in postings for word in words):
+            return [], 0
+
+        # Intersect starting from the rarest word so the candidate set stays small
+        words.sort(key=lambda word: len(postings[word]))
+        candidates = set(postings[words[0]])
+        for word in words[1:]:
+            candidates.intersection_update(postings[word])
+
+        if category_id:
+            candidates.intersection_update(bill_id for bill_id, in db.session.query(BillCategory.bill_id)
+                                           .filter(BillCategory.category_id == category_id))
+
+        scores = {bill_id: sum(postings[word][bill_id] * log(1 + self._bill_count / len(postings[word]))
+                               for word in words)
+                  for bill_id in candidates}
+        ranked = sorted(scores, key=lambda bill_id: (-scores[bill_id], bill_id))
+
+        page_ids = ranked[(page - 1) * per_page:page * per_page]
+        bills = {bill.bill_id: bill for bill in Bill.query.filter(Bill.bill_id.in_(page_ids))} if page_ids else {}
+        return [bills[bill_id] for bill_id in page_ids if bill_id in bills], len(ranked)
+
+
+bill_search_index = BillSearchIndex()
@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from hashlib import sha256
+from os import makedirs, path, listdir, remove, replace, stat, utime
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import monotonic, time
+import pickle
+
+
+class LRUCache:
+    """Bounded least recently used cache whose entries expire after a time to live"""
+
+    def __init__(self, maxsize, ttl=None):
+        """
+            :param maxsize: int, most entries kept before the least recently used one is evicted
+            :param ttl: float, seconds an entry stays valid, or None to keep entries until evicted
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Gets a value from the cache and marks it as recently used
+            :param key: key the value was stored under
+            :param default: returned when the key is missing or expired
+            :return: cached value or default
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self.ttl is not None and monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Stores a value, evicting the least recently used entries if the cache is full
+            :param key: key to store the value under
+            :param value: value to store
+            :return None
+        """
+
+        with self._lock:
+            self._entries[key] = (value, monotonic())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Removes a key from the cache if it is there
+            :param key: key to remove
+            :return None
+        """
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Empties the cache, counters are kept
+            :return None
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters describing how well the cache is doing
+            :return dict: size, maxsize, hits, misses and evictions
+        """
+
+        return {'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class FileCache:
+    """Cache kept as one pickle file per entry in a directory, so every worker process on a machine shares it
+
+    Same interface as LRUCache. Entries are written to a temporary file and renamed into place, so readers never see
+    half an entry. Reading an entry touches its file, and once there are more than maxsize entries the least
+    recently used files are removed.
+    """
+
+    def __init__(self, directory, maxsize, ttl=None):
+        """
+            :param directory: str, where entries are stored, created if missing
+            :param maxsize: int, most entries kept before the least recently used ones are evicted
+            :param ttl: float, seconds an entry stays valid, or None to keep entries until evicted
+        """
+
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entry_names())
+
+    def _entry_names(self):
+        # Temporary files being written start with a dot
+        return [name for name in listdir(self.directory) if not name.startswith(".")]
+
+    def _path(self, key):
+        return path.join(self.directory, sha256(str(key).encode()).hexdigest())
+
+    def get(self, key, default=None):
+        """Gets a value from the cache
+            :param key: key the value was stored under
+            :param default: returned when the key is missing or expired
+            :return: cached value or default
+        """
+
+        entry_path = self._path(key)
+        try:
+            with open(entry_path, "rb") as file:
+                value, stored_at = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+
+        if self.ttl is not None and time() - stored_at > self.ttl:
+            self.delete(key)
+            self.misses += 1
+            return default
+
+        try:
+            utime(entry_path)
+        except FileNotFoundError:
+            pass
+
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Stores a value, replacing any other worker's entry for the same key
+            :param key: key to store the value under
+            :param value: picklable value to store
+            :return None
+        """
+
+        with NamedTemporaryFile("wb", dir=self.directory, prefix=".", delete=False) as file:
+            pickle.dump((value, time()), file)
+        replace(file.name, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until there are at most maxsize
+            :return None
+        """
+
+        names = self._entry_names()
+        if len(names) <= self.maxsize:
+            return
+
+        last_used = {}
+        for name in names:
+            try:
+                last_used[name] = stat(path.join(self.directory, name)).st_mtime
+            except FileNotFoundError:
+                pass
+
+        # Other workers may be evicting at the same time, so files can already be gone
+        for name in sorted(last_used, key=last_used.get)[:len(last_used) - self.maxsize]:
+            try:
+                remove(path.join(self.directory, name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def delete(self, key):
+        """Removes a key from the cache if it is there
+            :param key: key to remove
+            :return None
+        """
+
+        try:
+            remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Removes every entry, including ones written by other workers
+
+        Temporary files are left alone, another worker may be about to rename one into place.
+
+            :return None
+        """
+
+        for name in self._entry_names():
+            try:
+                remove(path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Counters describing how well the cache is doing, hits, misses and evictions are for this process only
+            :return dict: size, maxsize, hits, misses and evictions
+        """
+
+        return {'size': len(self),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
@@ -1,7 +1,8 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
 from .db import db
-import requests
-from .consts import PROPUBLICA_KEY
-from .helpers import parse_vote_from_json
+from .helpers import parse_chamber
+from .sync_checkpoint import SyncCheckpoint
 
 class Congressperson(db.Model):
     """Congressperson for Voter Info Project"""
@@ -10,8 +11,12 @@ class Congressperson(db.Model):
 
     congress_id = db.Column(db.String, unique=True, nullable=False, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
+    name_key = db.Column(db.String(64), index=True)
     title = db.Column(db.String(32), nullable=False)
+    chamber = db.Column(db.Enum("House", "Senate", name="chamber"), index=True)
     party = db.Column(db.String(32), nullable=False)
+    state = db.Column(db.String(2))
+    district = db.Column(db.String(8))
     phone = db.Column(db.String(20))
     votes_with_party_pct = db.Column(db.Float)
     next_election = db.Column(db.DateTime)
@@ -25,41 +30,121 @@ class Congressperson(db.Model):
         """
         return self.next_election.year
 
+    def get_chamber(self):
+        """Gets the chamber of Congress this congressperson sits in
+            :return str: "Senate" for senators, "House" for everyone else
+        """
+
+        return self.chamber or parse_chamber(self.title)
+
+    def to_dict(self):
+        """Serializes the congressperson for the JSON api
+            :return dict: public information about the congressperson
+        """
+
+        return {'congress_id': self.congress_id,
+                'name': self.name,
+                'title': self.title,
+                'chamber': self.get_chamber(),
+                'party': self.party,
+                'state': self.state,
+                'district': self.district,
+                'phone': self.phone,
+                'next_election': self.get_election_year() if self.next_election else None,
+                'votes_with_party_pct': self.votes_with_party_pct,
+                'twitter': self.twitter,
+                'facebook': self.facebook,
+                'youtube': self.youtube,
+                }
+
+    @classmethod
+    def filter_by_fields(cls, chamber=None, party=None, state=None, next_election=None, name=None, congress_id=None):
+        """Builds a query for congresspeople matching every filter that is given
+            :param chamber: str, "Senate" or "House"
+            :param party: str, party abbreviation such as "D"
+            :param state: str, two letter state abbreviation
+            :param next_election: int, year of next election
+            :param name: str, full name
+            :param congress_id: str, ProPublica member id
+            :return Query: congresspeople ordered by name
+        """
+
+        query = cls.query
+        if chamber:
+            query = query.filter(cls.chamber == chamber)
+        if party:
+            query = query.filter(cls.party == party)
+        if state:
+            query = query.filter(cls.state == state.upper())
+        if next_election:
+            query = query.filter(cls.next_election >= datetime(next_election, 1, 1),
+                                 cls.next_election < datetime(next_election + 1, 1, 1))
+        if name:
+            query = query.filter(cls.name == name)
+        if congress_id:
+            query = query.filter(cls.congress_id == congress_id)
+
+        return query.order_by(cls.name, cls.congress_id)
+
     @classmethod
     def get_senators(cls):
-        """Gets all congresspeople with the title Senator from database
+        """Gets all congresspeople in the Senate from database
             :return [Congressperson]: list of Senators
         """
 
-        senators = cls.query.filter(cls.title.like("Senator%")).all()
+        senators = cls.query.filter(cls.chamber == "Senate").all()
         return senators
 
     @classmethod
     def get_representatives(cls):
-        """Gets all congresspeople with the title Representative from database
+        """Gets all congresspeople in the House from database, including delegates
             :return [Congressperson]: list of Representatives
         """
 
-        representatives = cls.query.filter(cls.title == "Representative").all()
+        representatives = cls.query.filter(cls.chamber == "House").all()
         return representatives
 
-    def get_vote_from_roll_call(self, bill):
-        """Takes a roll call number from a bill and determines how your congressperson voted on that bill
-            :param bill: Bill
-            :return str: Congressperson's vote infomration
+    @classmethod
+    def get_for_district(cls, state, district):
+        """Gets the senators of a state and the representative of one of its districts with one query
+            :param state: str, two letter state abbreviation
+            :param district: str, district as the roster names it, such as "7" or "At-Large"
+            :return [Congressperson]: senators first, then the representative
         """
 
-        if "Representative" in self.title:
-            if bill.house_votes_url:
-                vote_url = bill.house_votes_url
-            else:
-                return "No vote information found"
-        elif "Senator" in self.title:
-            if bill.senate_votes_url:
-                vote_url = bill.senate_votes_url
-            else:
-                return "No vote information found"
-
-        vote_request = requests.get(vote_url, headers={'X-API-Key': PROPUBLICA_KEY})
-        vote_json = vote_request.json()
-        return parse_vote_from_json(vote_json, self)
+        members = cls.query.filter(cls.state == state,
+                                   or_(cls.chamber == "Senate",
+                                       and_(cls.chamber == "House", cls.district == district))).all()
+        return sorted(members, key=lambda member: member.chamber != "Senate")
+
+    @classmethod
+    def bulk_upsert(cls, rows):
+        """Inserts new congresspeople and updates changed ones in a single transaction, safe to re-run
+            :param rows: [dict] column values for each congressperson, keyed by column name
+            :return dict: number of rows inserted, updated and unchanged
+        """
+
+        # Load what we already have as plain tuples so comparing the roster doesn't hydrate ORM objects
+        columns = cls.__table__.columns
+        congress_ids = [row['congress_id'] for row in rows]
+        existing = {stored.congress_id: stored._asdict()
+                    for stored in db.session.query(*columns).filter(cls.congress_id.in_(congress_ids))}
+
+        inserts = []
+        updates = []
+        for row in rows:
+            stored = existing.get(row['congress_id'])
+            if stored is None:
+                inserts.append(row)
+            elif any(stored[key] != value for key, value in row.items()):
+                updates.append(row)
+
+        db.session.bulk_insert_mappings(cls, inserts)
+        db.session.bulk_update_mappings(cls, updates)
+        if inserts or updates:
+            SyncCheckpoint.mark_content_changed()
+        db.session.commit()
+
+        return {'inserted': len(inserts),
+                'updated': len(updates),
+                'unchanged': len(rows) - len(inserts) - len(updates)}
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from os import environ
 
 HOUSE_URL = "https://api.propublica.org/congress/v1/115/house/members.json"
@@ -7,5 +8,111 @@ REPRESENTATIVE_URL = "https://www.googleapis.com/civicinfo/v2/representatives?ke
 ROLL_CALL_URL = "https://api.propublica.org/congress/v1/115/bills/{bill-id}.json"
 VOTE_URL = "https://api.propublica.org/congress/v1/115/{chamber}/sessions/{session-number}/votes/{roll-call-number}.json"
 
-PROPUBLICA_KEY = environ['PROPUBLICA_CONGRESS_KEY']
-CIVIC_KEY = environ['GOOGLE_CIVIC_KEY']
+# Outbound requests, concurrency is how many ingest requests may be in flight at once
+REQUEST_TIMEOUT = 30
+INGEST_CONCURRENCY = int(environ.get('INGEST_CONCURRENCY', 8))
+
+# Streamed payloads are written to the database this many records at a time
+INGEST_BATCH_SIZE = 500
+
+# Requests per second allowed to each api, with bursts up to API_BURST. Background jobs leave BACKGROUND_RESERVE
+# tokens in the bucket for pages. Buckets are per process unless RATE_LIMIT_DIR points every process at one directory
+API_RATE_LIMIT = float(environ.get('API_RATE_LIMIT', 5))
+API_BURST = 10
+BACKGROUND_RESERVE = 5
+RATE_LIMIT_DIR = environ.get('RATE_LIMIT_DIR')
+
+# Throttled (429) and server error responses are retried after a random wait of up to RETRY_BACKOFF * 2 ** attempt
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+# Longest a retry will wait in seconds, a page waits much less than a background job. A Retry-After longer than this
+# gives up and hands back the error response instead
+INTERACTIVE_MAX_RETRY_WAIT = 2
+BACKGROUND_MAX_RETRY_WAIT = 60
+
+# Upper bounds in seconds of the latency histograms served on /metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# A feed checked more recently than this is skipped by sync.py, which is also how a crashed sync resumes
+SYNC_INTERVAL = timedelta(hours=20)
+
+# worker.py refreshes bills that have never been refreshed, and re-checks bills with action inside the active
+# window every refresh interval
+BILL_REFRESH_INTERVAL = timedelta(hours=6)
+BILL_ACTIVE_WINDOW = timedelta(days=2)
+WORKER_POLL_SECONDS = 60
+
+# A claimed job is hidden from other workers for the lease, and handed out again if its worker died. A bill that
+# fails to refresh is retried after REFRESH_RETRY_BACKOFF * 2 ** (attempts - 1), at most REFRESH_MAX_BACKOFF
+REFRESH_LEASE = timedelta(minutes=10)
+REFRESH_RETRY_BACKOFF = timedelta(minutes=5)
+REFRESH_MAX_BACKOFF = timedelta(hours=6)
+
+# Largest page the JSON api will return
+MAX_PAGE_SIZE = 200
+
+# Most bills the batch bill api answers for in one request
+MAX_BILLS_PER_REQUEST = 50
+
+# Rows fetched from the server-side cursor at a time when exporting, the user_categories export needs EXPORT_TOKEN
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_TOKEN = environ.get('EXPORT_TOKEN')
+
+# How often the in-memory typeahead and bill search indexes and the page cache check whether sync.py has run and
+# they need rebuilding
+INDEX_REFRESH_SECONDS = 60
+SUGGEST_LIMIT = 10
+SEARCH_PAGE_SIZE = 20
+FEED_PAGE_SIZE = 25
+
+# Anonymous pages are cached in process unless RESPONSE_CACHE_DIR points every worker at a shared directory
+RESPONSE_CACHE_DIR = environ.get('RESPONSE_CACHE_DIR')
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 60 * 60
+
+# Party unity and agreement are recomputed whenever a roll call is stored, and at least this often in seconds
+ANALYTICS_CACHE_TTL = 24 * 60 * 60
+
+# Representatives only change with elections and redistricting, so an address lookup is good for a month
+REPRESENTATIVE_CACHE_TTL = timedelta(days=30)
+
+# Spelled out words that are abbreviated when normalizing addresses
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st',
+    'avenue': 'ave',
+    'road': 'rd',
+    'drive': 'dr',
+    'boulevard': 'blvd',
+    'lane': 'ln',
+    'court': 'ct',
+    'place': 'pl',
+    'apartment': 'apt',
+    'suite': 'ste',
+    'north': 'n',
+    'south': 's',
+    'east': 'e',
+    'west': 'w',
+}
+
+# Census state FIPS codes, for ZCTA to congressional district files that only give the state as a number
+STATE_FIPS = {
+    '01': 'AL', '02': 'AK', '04': 'AZ', '05': 'AR', '06': 'CA', '08': 'CO', '09': 'CT', '10': 'DE', '11': 'DC',
+    '12': 'FL', '13': 'GA', '15': 'HI', '16': 'ID', '17': 'IL', '18': 'IN', '19': 'IA', '20': 'KS', '21': 'KY',
+    '22': 'LA', '23': 'ME', '24': 'MD', '25': 'MA', '26': 'MI', '27': 'MN', '28': 'MS', '29': 'MO', '30': 'MT',
+    '31': 'NE', '32': 'NV', '33': 'NH', '34': 'NJ', '35': 'NM', '36': 'NY', '37': 'NC', '38': 'ND', '39': 'OH',
+    '40': 'OK', '41': 'OR', '42': 'PA', '44': 'RI', '45': 'SC', '46': 'SD', '47': 'TN', '48': 'TX', '49': 'UT',
+    '50': 'VT', '51': 'VA', '53': 'WA', '54': 'WV', '55': 'WI', '56': 'WY', '60': 'AS', '66': 'GU', '69': 'MP',
+    '72': 'PR', '78': 'VI',
+}
+
+# Census numbers at-large seats 0, or 98 for delegates, ProPublica calls them all "At-Large"
+AT_LARGE_DISTRICTS = {0, 98}
+AT_LARGE = "At-Large"
+
+# Generational suffixes dropped when matching politicians' names
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv'}
+
+# Keys are optional at import time so the app can run against recorded responses, see benchmark/
+PROPUBLICA_KEY = environ.get('PROPUBLICA_CONGRESS_KEY', '')
+CIVIC_KEY = environ.get('GOOGLE_CIVIC_KEY', '')
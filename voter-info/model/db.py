@@ -1,16 +1,18 @@
+from os import environ
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
 
-def connect_to_db(app):
+def connect_to_db(app, db_uri=None):
     """Connect the database to our Flask app.
     :param app: Flask application
+    :param db_uri: database to use instead of DATABASE_URL or our PostgreSQL database
     :return None
     """
 
     # Configure to use our PostgreSQL database
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///voteinfo'
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri or environ.get('DATABASE_URL', 'postgresql:///voteinfo')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.app = app
     db.init_app(app)
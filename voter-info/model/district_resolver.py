@@ -0,0 +1,95 @@
+from threading import Lock
+from time import monotonic
+import numpy as np
+from .db import db
+from .zip_district import ZipDistrict
+from .sync_checkpoint import SyncCheckpoint
+from .consts import INDEX_REFRESH_SECONDS, AT_LARGE
+
+
+class DistrictResolver:
+    """In-memory index from ZIP code to congressional district, so finding a user's members needs no external api
+
+    Rows are kept as three parallel numpy arrays sorted by ZCTA, a few bytes per row, and a lookup is a binary
+    search for the ZCTA's rows.
+    """
+
+    def __init__(self):
+        self._zctas = np.zeros(0, dtype=np.int32)
+        self._state_codes = np.zeros(0, dtype=np.uint8)
+        self._districts = np.zeros(0, dtype=np.int16)
+        self._states = []
+        self._built_for = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    def build(self, rows):
+        """Replaces the index
+            :param rows: [(int, str, int)] zcta, state and district, 0 for at-large seats
+            :return None
+        """
+
+        states = sorted({state for zcta, state, district in rows})
+        state_codes = {state: code for code, state in enumerate(states)}
+
+        zctas = np.array([zcta for zcta, state, district in rows], dtype=np.int32)
+        order = np.argsort(zctas, kind="stable")
+
+        # Swap everything in at once so lookups never see half an index
+        self._zctas, self._state_codes, self._districts, self._states = (
+            zctas[order],
+            np.array([state_codes[state] for zcta, state, district in rows], dtype=np.uint8)[order],
+            np.array([district for zcta, state, district in rows], dtype=np.int16)[order],
+            states)
+
+    def build_from_db(self):
+        """Rebuilds the index from the imported ZCTA to district rows
+            :return None
+        """
+
+        self.build(db.session.query(ZipDistrict.zcta, ZipDistrict.state, ZipDistrict.district).all())
+
+    def refresh_if_stale(self):
+        """Builds the index if it was never built, or rebuilds it if districts have been imported since
+
+        The database is asked at most once every INDEX_REFRESH_SECONDS.
+
+            :return None
+        """
+
+        if self._checked_at is not None and monotonic() - self._checked_at < INDEX_REFRESH_SECONDS:
+            return
+
+        with self._lock:
+            self._checked_at = monotonic()
+            imported_at = db.session.query(SyncCheckpoint.checked_at).filter(
+                SyncCheckpoint.sync_key == ZipDistrict.SYNC_KEY).scalar()
+            if imported_at != self._built_for:
+                self.build_from_db()
+                self._built_for = imported_at
+
+    def get_districts(self, zip_code):
+        """Gets every district a ZIP code overlaps
+            :param zip_code: str, five digits
+            :return [(str, str)]: state and district, with the district named the way the roster names it
+        """
+
+        zcta = int(zip_code)
+        start = np.searchsorted(self._zctas, zcta, side="left")
+        end = np.searchsorted(self._zctas, zcta, side="right")
+
+        return [(self._states[state_code], str(district) if district else AT_LARGE)
+                for state_code, district in zip(self._state_codes[start:end].tolist(),
+                                                self._districts[start:end].tolist())]
+
+    def resolve(self, zip_code):
+        """Gets the one district a ZIP code lies in
+            :param zip_code: str, five digits
+            :return (str, str): state and district, or None if the ZIP code is unknown or split between districts
+        """
+
+        districts = self.get_districts(zip_code)
+        return districts[0] if len(districts) == 1 else None
+
+
+district_resolver = DistrictResolver()
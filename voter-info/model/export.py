@@ -0,0 +1,140 @@
+from csv import writer
+from io import StringIO, BytesIO
+from sqlalchemy import select, Integer, Float, DateTime, Boolean
+from .db import db
+from .congressperson import Congressperson
+from .bill import Bill
+from .bill_category import BillCategory
+from .user_category import UserCategory
+from .vote import Vote, VotePosition
+from .consts import EXPORT_CHUNK_SIZE
+
+# Arrow IPC export is optional, CSV works without it
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def select_vote_positions(congress):
+    """Every member's position on every stored roll call, with the roll call's details on each row
+        :param congress: int, only export this congress, or None for all of them
+        :return Select
+    """
+
+    query = (select([Vote.congress, Vote.chamber, Vote.session, Vote.roll_call, Vote.bill_id, Vote.vote_date,
+                     VotePosition.congress_id, VotePosition.vote_position])
+             .select_from(VotePosition.__table__.join(Vote.__table__))
+             .order_by(VotePosition.vote_position_id))
+    if congress:
+        query = query.where(Vote.congress == congress)
+    return query
+
+
+# Datasets that can be exported, each a query over plain columns so rows never become ORM objects
+DATASETS = {
+    'congresspeople': lambda congress: select([column for column in Congressperson.__table__.columns])
+                                       .order_by(Congressperson.congress_id),
+    'bills': lambda congress: select([Bill.bill_id, Bill.bill_title, Bill.bill_uri, Bill.summary,
+                                      Bill.latest_action_date, Bill.house_roll_call, Bill.senate_roll_call,
+                                      Bill.refreshed_at])
+                              .order_by(Bill.bill_id),
+    'bill_categories': lambda congress: select([BillCategory.bill_id, BillCategory.category_id])
+                                        .order_by(BillCategory.bill_category_id),
+    'user_categories': lambda congress: select([UserCategory.user_id, UserCategory.category_id])
+                                        .order_by(UserCategory.user_category_id),
+    'vote_positions': lambda congress: select_vote_positions(congress),
+}
+
+# Datasets with user data, only exported through export.py or with the export token
+PRIVATE_DATASETS = {'user_categories'}
+
+FORMATS = {'csv': "text/csv", 'arrow': "application/vnd.apache.arrow.stream"}
+
+
+def iter_chunks(dataset, congress=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Runs a dataset's query on a server-side cursor and hands the rows back a chunk at a time
+        :param dataset: str, key of DATASETS
+        :param congress: int, only export this congress, for datasets that have one
+        :param chunk_size: int, rows fetched from the database at once
+        :return ([Column], generator of [tuple]): columns of the dataset and its rows in chunks
+    """
+
+    query = DATASETS[dataset](congress)
+
+    def chunks():
+        # stream_results makes psycopg2 use a named cursor, so the result set stays on the server
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+            rows = result.fetchmany(chunk_size)
+            while rows:
+                yield rows
+                rows = result.fetchmany(chunk_size)
+
+    return list(query.columns), chunks()
+
+
+def iter_csv(dataset, congress=None):
+    """Exports a dataset as CSV, a header line followed by every row
+        :param dataset: str, key of DATASETS
+        :param congress: int, only export this congress, for datasets that have one
+        :return generator of str: the CSV a chunk of rows at a time
+    """
+
+    columns, chunks = iter_chunks(dataset, congress)
+
+    buffer = StringIO()
+    csv_writer = writer(buffer)
+    csv_writer.writerow([column.name for column in columns])
+
+    for rows in chunks:
+        csv_writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def get_arrow_type(column):
+    """Picks the Arrow type for a column so every chunk shares one schema, even chunks where a column is all null
+        :param column: Column
+        :return DataType
+    """
+
+    if isinstance(column.type, Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, Float):
+        return pyarrow.float64()
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp("us")
+    if isinstance(column.type, Boolean):
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+
+def iter_arrow(dataset, congress=None):
+    """Exports a dataset in the Arrow IPC streaming format, one record batch per chunk of rows
+        :param dataset: str, key of DATASETS
+        :param congress: int, only export this congress, for datasets that have one
+        :return generator of bytes: the stream a record batch at a time
+    """
+
+    if pyarrow is None:
+        raise RuntimeError("Arrow export needs pyarrow, pip install pyarrow")
+
+    columns, chunks = iter_chunks(dataset, congress)
+    schema = pyarrow.schema([(column.name, get_arrow_type(column)) for column in columns])
+
+    sink = BytesIO()
+    with pyarrow.ipc.new_stream(sink, schema) as stream_writer:
+        for rows in chunks:
+            arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            stream_writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+
+            # Hand over what has been written so far and empty the buffer for the next batch
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+
+    yield sink.getvalue()
@@ -1,42 +1,119 @@
 from datetime import datetime
+from itertools import islice
+import re
+import unicodedata
+import ijson
+from .consts import ADDRESS_ABBREVIATIONS, NAME_SUFFIXES, STATE_FIPS
 
 
-def remove_middle_name(name):
-    """Removes middle name from politician for easier integration of conflicting apis
+def fold_accents(text):
+    """Replaces accented letters with their plain ascii versions
+        :param text: str
+        :return str: text without accents
+    """
+
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def normalize_search_text(text):
+    """Reduces text to lower case words so searches ignore case, accents and punctuation
+        :param text: str
+        :return str: words of the text separated by single spaces
+    """
+
+    return " ".join(re.sub(r"[^a-z0-9]", " ", fold_accents(text).lower()).split())
+
+
+def normalize_name(name):
+    """Reduces a politician's name to first and last name so names from conflicting apis can be matched
         :param name: string representing name of politician
-        :return str: name without middle name
+        :return str: lower case first and last name without accents, initials, nicknames or suffixes
+    """
+
+    name = fold_accents(name).lower()
+    name = re.sub(r'"[^"]*"', " ", name)
+    name_parts = [part for part in re.sub(r"[^a-z' -]", " ", name).split()
+                  if len(part) > 1 and part not in NAME_SUFFIXES]
+    if not name_parts:
+        return ""
+    return name_parts[0] + " " + name_parts[-1]
+
+
+def normalize_address(address):
+    """Reduces an address to a canonical form so the same place written differently is only looked up once
+        :param address: str typed in by user
+        :return str: lower case address without punctuation and with common words abbreviated
+    """
+
+    words = re.sub(r"[^a-z0-9 ]", " ", address.lower()).split()
+    return " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def parse_zip_code(address):
+    """Finds the ZIP code in an address, the last five digit number so house numbers aren't mistaken for it
+        :param address: str typed in by user
+        :return str: five digit ZIP code, or None if the address doesn't have one
     """
 
-    name_parts = name.split(" ")
-    for part in name_parts:
-        if '.' in part:
-            name_parts.remove(part)
-    return " ".join(name_parts)
+    zip_codes = re.findall(r"\b(\d{5})(?:-\d{4})?\b", address or "")
+    return zip_codes[-1] if zip_codes else None
+
+
+def parse_state(address):
+    """Finds the state in an address, a state abbreviation ending the address or followed only by the ZIP code
+        :param address: str typed in by user
+        :return str: upper case state abbreviation, or None if the address doesn't end with one
+    """
 
+    match = re.search(r"\b([A-Za-z]{2})[\s,]*(?:\d{5}(?:-\d{4})?)?\s*$", address or "")
+    if match and match.group(1).upper() in STATE_FIPS.values():
+        return match.group(1).upper()
 
-def parse_vote_from_json(json, congressperson):
-    """Parses json to get congressperson's vote data
-    :param json: vote JSON file from ProPublica
-    :param congressperson: Congressperson
-    :return str: vote position associated with congressperson"""
 
-    if json.get('error') or json.get('errors') or json.get('status') == "ERROR":
-        print("No results found")
-        return
+def iter_json_items(stream, prefix, fields=None):
+    """Walks a JSON array inside a document as it is read, one item at a time, so the whole document never has to be
+    held in memory
 
-    vote_positions = json['results']['votes']['vote']['positions']
-    print()
-    print()
-    print()
-    print("======================================")
+        :param stream: file-like object the JSON is read from
+        :param prefix: str, ijson path to the array, such as "results.item.members" for results[0].members and the
+            members of any later result
+        :param fields: dict whose keys are ijson paths to scalars outside the array, such as "status", the values
+            found for them are stored into it as they are read
+        :return generator of dict: items of the array
+    """
 
-    for position in vote_positions:
-        if position['member_id'] == congressperson.congress_id:
-            vote = position['vote_position']
-            print(vote)
-            return vote
+    item_prefix = prefix + ".item"
+    builder = None
+
+    for event_prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            # Nested containers have longer prefixes, so this is the end of the item itself
+            if event_prefix == item_prefix and event in ("end_map", "end_array"):
+                yield builder.value
+                builder = None
+        elif event_prefix == item_prefix:
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif fields is not None and event_prefix in fields:
+            fields[event_prefix] = value
+
+
+def iter_batches(items, size):
+    """Groups items into lists so they can be written to the database a batch at a time
+        :param items: iterable
+        :param size: int, most items in a batch
+        :return generator of list
+    """
 
-    return "No vote information found"
+    items = iter(items)
+    batch = list(islice(items, size))
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
 
 
 def parse_name(first_name, last_name):
@@ -49,6 +126,17 @@ def parse_name(first_name, last_name):
     return first_name + " " + last_name
 
 
+def parse_chamber(title):
+    """Works out which chamber a congressperson sits in from their ProPublica title
+        :param title: str such as "Senator, 2nd Class" or "Representative"
+        :return str: "Senate" for senators, "House" for representatives, delegates and resident commissioners
+    """
+
+    if title.startswith("Senator"):
+        return "Senate"
+    return "House"
+
+
 def parse_year(year):
     """Shows year given a datetime
         :param year: str
@@ -58,6 +146,15 @@ def parse_year(year):
     return datetime.strptime(year, '%Y')
 
 
+def parse_date(date):
+    """Shows date given a ProPublica date string
+        :param date: str formatted as YYYY-MM-DD
+        :return Datetime
+    """
+
+    return datetime.strptime(date, '%Y-%m-%d')
+
+
 # Helper Functions
 
 def format_category_name(category):
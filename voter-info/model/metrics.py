@@ -0,0 +1,230 @@
+from bisect import bisect_left
+from re import escape, sub, compile
+from threading import Lock
+from urllib.parse import urlsplit
+from .consts import (HOUSE_URL, SENATE_URL, BILL_BY_CATEGORY_URL, REPRESENTATIVE_URL, ROLL_CALL_URL, VOTE_URL,
+                     LATENCY_BUCKETS)
+
+
+class Counter:
+    """Prometheus counter, one running total per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels):
+        """
+            :param name: str, metric name
+            :param documentation: str, shown as the metric's HELP line
+            :param labels: (str) label names, values are passed to inc in the same order
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, label_values, amount=1):
+        """Adds to the total for one combination of label values
+            :param label_values: (str) one value per label
+            :param amount: number to add
+            :return None
+        """
+
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        """Formats the metric for the Prometheus text exposition format
+            :return [str]: lines
+        """
+
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labels, label_values)} {value}" for label_values, value in values]
+
+
+class Histogram:
+    """Prometheus histogram, counting observations into cumulative buckets per combination of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels, buckets=LATENCY_BUCKETS):
+        """
+            :param name: str, metric name
+            :param documentation: str, shown as the metric's HELP line
+            :param labels: (str) label names, values are passed to observe in the same order
+            :param buckets: (float) sorted upper bounds, an infinite bucket is always added
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, label_values, value):
+        """Records one observation
+            :param label_values: (str) one value per label
+            :param value: float, such as a latency in seconds
+            :return None
+        """
+
+        with self._lock:
+            counts, total = self._series.get(label_values, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def render(self):
+        """Formats the metric for the Prometheus text exposition format
+            :return [str]: lines
+        """
+
+        with self._lock:
+            series = sorted((label_values, list(counts), total)
+                            for label_values, (counts, total) in self._series.items())
+
+        lines = []
+        bucket_labels = self.labels + ("le",)
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(bucket_labels, label_values + (str(bound),))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class CacheStat:
+    """One of the counters from stats() of every registered cache, read when /metrics is scraped"""
+
+    def __init__(self, name, documentation, kind, stat):
+        """
+            :param name: str, metric name
+            :param documentation: str, shown as the metric's HELP line
+            :param kind: str, "counter" or "gauge"
+            :param stat: str, key of the value in the cache's stats()
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.stat = stat
+
+    def render(self):
+        """Formats the metric for the Prometheus text exposition format
+            :return [str]: lines
+        """
+
+        return [f"{self.name}{format_labels(('cache',), (name,))} {cache.stats()[self.stat]}"
+                for name, cache in sorted(CACHES.items())]
+
+
+def register_cache(name, cache):
+    """Reports a cache's hits, misses, evictions and size on /metrics
+        :param name: str, value of the cache label
+        :param cache: LRUCache, FileCache or anything else with stats
+        :return None
+    """
+
+    CACHES[name] = cache
+
+
+def format_labels(names, values):
+    """Formats label pairs as {name="value",...}, escaping the values
+        :param names: (str) label names
+        :param values: (str) label values
+        :return str
+    """
+
+    pairs = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def escape_label(value):
+    """Escapes a label value for the text exposition format
+        :param value: str
+        :return str
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def template_pattern(url):
+    """Turns one of the url templates from consts into a pattern matching the paths it produces
+        :param url: str such as ".../bills/subjects/{subject}.json"
+        :return Pattern
+    """
+
+    return compile(sub(r"\\\{[^}]+\\\}", "[^/]+", escape(urlsplit(url).path)) + "$")
+
+
+# Endpoint names used as metric labels, so every subject or roll call url counts towards one series
+ENDPOINTS = [(name, template_pattern(url)) for name, url in [
+    ("house_members", HOUSE_URL),
+    ("senate_members", SENATE_URL),
+    ("bills_by_subject", BILL_BY_CATEGORY_URL),
+    ("bill", ROLL_CALL_URL),
+    ("roll_call", VOTE_URL),
+    ("representatives", REPRESENTATIVE_URL),
+]]
+
+
+def get_endpoint(url):
+    """Names the api endpoint a url belongs to
+        :param url: str, any url sent through ApiClient
+        :return str: name from ENDPOINTS, or the host for urls that match none of them
+    """
+
+    parts = urlsplit(url)
+    for name, pattern in ENDPOINTS:
+        if pattern.match(parts.path):
+            return name
+    return parts.netloc
+
+
+api_request_seconds = Histogram("voterinfo_api_request_seconds",
+                                "Time taken by outbound api requests, including reading the body",
+                                ("api", "endpoint"))
+api_requests = Counter("voterinfo_api_requests_total",
+                       "Outbound api requests by response status, error if no response came back, the per api "
+                       "total is what counts against its daily quota",
+                       ("api", "endpoint", "status"))
+api_coalesced_requests = Counter("voterinfo_api_coalesced_requests_total",
+                                 "Outbound api requests answered by a fetch of the same url already in flight",
+                                 ("api", "endpoint"))
+api_response_bytes = Counter("voterinfo_api_response_bytes_total",
+                             "Bytes received from outbound api requests",
+                             ("api", "endpoint"))
+http_request_seconds = Histogram("voterinfo_http_request_seconds",
+                                 "Time taken to answer requests to the app, by route",
+                                 ("route", "method", "status"))
+
+
+# Caches reported on /metrics keyed by name, see register_cache
+CACHES = {}
+
+cache_hits = CacheStat("voterinfo_cache_hits_total", "Lookups answered by the cache", "counter", "hits")
+cache_misses = CacheStat("voterinfo_cache_misses_total", "Lookups the cache could not answer", "counter", "misses")
+cache_evictions = CacheStat("voterinfo_cache_evictions_total", "Entries removed to make room for new ones", "counter",
+                            "evictions")
+cache_entries = CacheStat("voterinfo_cache_entries", "Entries in the cache", "gauge", "size")
+
+METRICS = [api_request_seconds, api_requests, api_coalesced_requests, api_response_bytes, http_request_seconds,
+           cache_hits, cache_misses, cache_evictions, cache_entries]
+
+
+def render_metrics():
+    """Formats every metric for a Prometheus scrape, values are for this process only
+        :return str: text exposition format
+    """
+
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
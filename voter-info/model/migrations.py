@@ -0,0 +1,153 @@
+from datetime import datetime
+from sqlalchemy import text
+from .db import db
+from .bill import SEARCH_VECTOR_DDL
+from .helpers import normalize_name
+
+
+class SchemaMigration(db.Model):
+    """Migration that has been applied to the database"""
+
+    __tablename__ = "schema_migrations"
+
+    version = db.Column(db.String(64), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+
+def add_columns_since_baseline(connection):
+    """Adds the columns models gained after the first release, db.create_all only creates missing tables"""
+
+    for statement in [
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS latest_action_date TIMESTAMP",
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS house_roll_call INTEGER",
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS senate_roll_call INTEGER",
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS house_votes_url VARCHAR",
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS senate_votes_url VARCHAR",
+        "ALTER TABLE bills ADD COLUMN IF NOT EXISTS refreshed_at TIMESTAMP",
+        "CREATE INDEX IF NOT EXISTS ix_bills_refreshed_at ON bills (refreshed_at)",
+        "ALTER TABLE congresspeople ADD COLUMN IF NOT EXISTS name_key VARCHAR(64)",
+        "ALTER TABLE congresspeople ADD COLUMN IF NOT EXISTS state VARCHAR(2)",
+        "ALTER TABLE congresspeople ADD COLUMN IF NOT EXISTS district VARCHAR(8)",
+        "CREATE INDEX IF NOT EXISTS ix_congresspeople_name_key ON congresspeople (name_key)",
+    ]:
+        connection.execute(text(statement))
+
+    # Names are normalized in Python, so name_key can't be backfilled with SQL alone
+    names = connection.execute(text("SELECT congress_id, name FROM congresspeople WHERE name_key IS NULL")).fetchall()
+    if names:
+        connection.execute(text("UPDATE congresspeople SET name_key = :name_key WHERE congress_id = :congress_id"),
+                           [{'congress_id': congress_id, 'name_key': normalize_name(name)}
+                            for congress_id, name in names])
+
+
+def add_bill_search_vector(connection):
+    """Adds the full-text search column, its trigger and GIN index, and fills it for existing bills"""
+
+    connection.execute(text("ALTER TABLE bills ADD COLUMN IF NOT EXISTS search_vector TSVECTOR"))
+    for statement in SEARCH_VECTOR_DDL:
+        connection.execute(text(statement))
+
+    connection.execute(text("""
+        UPDATE bills
+        SET search_vector = setweight(to_tsvector('pg_catalog.english', coalesce(bill_title, '')), 'A') ||
+                            setweight(to_tsvector('pg_catalog.english', coalesce(summary, '')), 'B')
+        WHERE search_vector IS NULL"""))
+
+
+def add_join_table_constraints(connection):
+    """Removes duplicate subscriptions and bill categories, then makes them impossible and indexes both tables"""
+
+    for statement in [
+        """DELETE FROM bill_categories duplicate USING bill_categories original
+           WHERE duplicate.bill_id = original.bill_id AND duplicate.category_id = original.category_id
+           AND duplicate.bill_category_id > original.bill_category_id""",
+        """DELETE FROM user_categories duplicate USING user_categories original
+           WHERE duplicate.user_id = original.user_id AND duplicate.category_id = original.category_id
+           AND duplicate.user_category_id > original.user_category_id""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS uq_bill_categories_bill_category
+           ON bill_categories (bill_id, category_id)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS uq_user_categories_user_category
+           ON user_categories (user_id, category_id)""",
+        "CREATE INDEX IF NOT EXISTS ix_bill_categories_category_bill ON bill_categories (category_id, bill_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_categories_category_user ON user_categories (category_id, user_id)",
+    ]:
+        connection.execute(text(statement))
+
+
+def add_congressperson_chamber(connection):
+    """Stores each congressperson's chamber as an indexed enum instead of matching on title"""
+
+    for statement in [
+        """DO $$ BEGIN
+               CREATE TYPE chamber AS ENUM ('House', 'Senate');
+           EXCEPTION WHEN duplicate_object THEN NULL;
+           END $$""",
+        "ALTER TABLE congresspeople ADD COLUMN IF NOT EXISTS chamber chamber",
+        """UPDATE congresspeople
+           SET chamber = CASE WHEN title LIKE 'Senator%' THEN 'Senate'::chamber ELSE 'House'::chamber END
+           WHERE chamber IS NULL""",
+        "CREATE INDEX IF NOT EXISTS ix_congresspeople_chamber ON congresspeople (chamber)",
+    ]:
+        connection.execute(text(statement))
+
+
+def add_bill_feed_index(connection):
+    """Indexes bills in feed order so a user's feed can be read a page at a time"""
+
+    connection.execute(text("""CREATE INDEX IF NOT EXISTS ix_bills_latest_action_date_bill
+                               ON bills (latest_action_date, bill_id)"""))
+
+
+def drop_sync_checkpoint_last_bill_id(connection):
+    """Drops the never read last bill column, subjects resume from latest_action_date alone"""
+
+    connection.execute(text("ALTER TABLE sync_checkpoints DROP COLUMN IF EXISTS last_bill_id"))
+
+
+def add_refresh_job_backoff(connection):
+    """Keeps refresh jobs queued until they succeed, with how often they failed and when they may run again"""
+
+    for statement in [
+        "ALTER TABLE refresh_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE refresh_jobs ADD COLUMN IF NOT EXISTS run_after TIMESTAMP",
+    ]:
+        connection.execute(text(statement))
+
+
+# Applied in order, each exactly once. Append new migrations to the end and never edit one that has shipped.
+MIGRATIONS = [
+    ("0001_columns_since_baseline", add_columns_since_baseline),
+    ("0002_bill_search_vector", add_bill_search_vector),
+    ("0003_join_table_constraints", add_join_table_constraints),
+    ("0004_congressperson_chamber", add_congressperson_chamber),
+    ("0005_bill_feed_index", add_bill_feed_index),
+    ("0006_drop_sync_checkpoint_last_bill_id", drop_sync_checkpoint_last_bill_id),
+    ("0007_refresh_job_backoff", add_refresh_job_backoff),
+]
+
+
+def migrate():
+    """Brings the database schema up to date with the models
+
+    Missing tables are created from the models, then every migration that hasn't been recorded in
+    schema_migrations runs in its own transaction. Migrations are written for Postgres, other databases only get
+    the tables created from the models, which already have every column, index and constraint.
+
+        :return [str]: versions that were applied
+    """
+
+    db.create_all()
+
+    applied = {version for version, in db.session.query(SchemaMigration.version)}
+    db.session.commit()
+    pending = [(version, migration) for version, migration in MIGRATIONS if version not in applied]
+
+    for version, migration in pending:
+        print(f"Applying {version}")
+        with db.engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                migration(connection)
+            connection.execute(SchemaMigration.__table__.insert(),
+                               {'version': version, 'applied_at': datetime.now()})
+
+    return [version for version, migration in pending]
@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.exc import IntegrityError
+from .db import db
+from .consts import INGEST_BATCH_SIZE, REFRESH_LEASE, REFRESH_RETRY_BACKOFF, REFRESH_MAX_BACKOFF
+from .helpers import iter_batches
+from .bill import Bill
+
+
+class RefreshJob(db.Model):
+    """Queued request to refresh a bill's roll call info for Voter Info Project, worked off by worker.py
+
+    A job stays queued until its bill has been refreshed. run_after hides it while a worker holds it and, after a
+    failed refresh, until its backoff has passed.
+    """
+
+    __tablename__ = "refresh_jobs"
+    __table_args__ = (db.Index("ix_refresh_jobs_priority", "priority", "enqueued_at"),)
+
+    bill_id = db.Column(db.String, db.ForeignKey(Bill.bill_id), primary_key=True)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    enqueued_at = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    run_after = db.Column(db.DateTime)
+
+    bill = db.relationship("Bill")
+
+    def __repr__(self):
+        return f'<bill_id={self.bill_id}, priority={self.priority}>'
+
+    @classmethod
+    def enqueue(cls, priorities):
+        """Queues bills for refreshing, raising the priority of bills that are already queued
+            :param priorities: {str: int} priority keyed by bill_id, higher priorities are refreshed first
+            :return None: updates database with the queued jobs
+        """
+
+        if not priorities:
+            return
+
+        if db.engine.dialect.name == "postgresql":
+            # Pages enqueue bills too, so two requests can queue the same bill at once, let the database merge them
+            # Sorted so concurrent enqueues lock rows in the same order
+            table = cls.__table__
+            for batch in iter_batches(sorted(priorities.items()), INGEST_BATCH_SIZE):
+                statement = postgresql_insert(table).values([{'bill_id': bill_id, 'priority': priority,
+                                                              'enqueued_at': datetime.now()}
+                                                             for bill_id, priority in batch])
+                statement = statement.on_conflict_do_update(
+                    index_elements=["bill_id"],
+                    set_={'priority': func.greatest(table.c.priority, statement.excluded.priority)})
+                db.session.execute(statement)
+            db.session.commit()
+            return
+
+        try:
+            cls._merge_priorities(priorities)
+        except IntegrityError:
+            # Another request queued one of the bills after we looked, it's there now so raise its priority instead
+            db.session.rollback()
+            cls._merge_priorities(priorities)
+
+    @classmethod
+    def _merge_priorities(cls, priorities):
+        """Inserts jobs for bills that aren't queued and raises the priority of those that are
+            :param priorities: {str: int} priority keyed by bill_id
+            :return None: updates database with the queued jobs
+        """
+
+        queued = {job.bill_id: job for job in cls.query.filter(cls.bill_id.in_(list(priorities)))}
+
+        new_jobs = []
+        for bill_id, priority in priorities.items():
+            job = queued.get(bill_id)
+            if job is None:
+                new_jobs.append({'bill_id': bill_id, 'priority': priority, 'enqueued_at': datetime.now()})
+            elif job.priority < priority:
+                job.priority = priority
+
+        db.session.bulk_insert_mappings(cls, new_jobs)
+        db.session.commit()
+
+    @classmethod
+    def enqueue_stale_bills(cls):
+        """Queues every stale bill, bills followed by more users get refreshed first
+            :return int: number of stale bills found
+        """
+
+        stale_bills = Bill.get_stale_bills()
+        cls.enqueue(dict(stale_bills))
+        return len(stale_bills)
+
+    @classmethod
+    def claim(cls):
+        """Takes the highest priority job that is due, leasing it to this worker
+
+        Locked rows are skipped so several workers can share the queue. The job stays queued, hidden until
+        REFRESH_LEASE has passed, so if the worker dies another one picks it up.
+
+            :return RefreshJob: job to work on, finish it with complete or retry_later, or None if none are due
+        """
+
+        now = datetime.now()
+        job = (cls.query
+               .filter(or_(cls.run_after.is_(None), cls.run_after <= now))
+               .order_by(cls.priority.desc(), cls.enqueued_at)
+               .with_for_update(skip_locked=True)
+               .first())
+        if job is None:
+            db.session.commit()
+            return
+
+        job.run_after = now + REFRESH_LEASE
+        db.session.commit()
+        return job
+
+    def complete(self):
+        """Takes the job off the queue once its bill has been refreshed
+            :return None
+        """
+
+        db.session.delete(self)
+        db.session.commit()
+
+    def retry_later(self):
+        """Puts the job back on the queue after a failed refresh, waiting longer after each failure
+            :return datetime: when the job will next be handed out
+        """
+
+        self.attempts += 1
+        self.run_after = datetime.now() + min(REFRESH_RETRY_BACKOFF * 2 ** (self.attempts - 1), REFRESH_MAX_BACKOFF)
+        db.session.commit()
+        return self.run_after
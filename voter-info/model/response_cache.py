@@ -0,0 +1,103 @@
+from functools import wraps
+from hashlib import sha1
+from threading import Lock
+from urllib.parse import urlencode
+from time import monotonic
+from flask import Response, make_response, request, session
+from .cache import LRUCache, FileCache
+from .metrics import register_cache
+from .sync_checkpoint import SyncCheckpoint
+from .consts import INDEX_REFRESH_SECONDS, RESPONSE_CACHE_DIR, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+
+
+class ResponseCache:
+    """Caches whole rendered pages for anonymous visitors, who all see the same page
+
+    Entries are keyed by the content version recorded by ingest, see SyncCheckpoint.mark_content_changed, so once
+    members, categories or bills change the old pages are never served again. The version is read from the database
+    at most once every INDEX_REFRESH_SECONDS.
+    """
+
+    def __init__(self, backend):
+        """
+            :param backend: LRUCache, FileCache or anything else with get, set and clear
+        """
+
+        self.backend = backend
+        self._version = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    def get_version(self):
+        """Gets the content version, clearing the cache when it has moved on
+            :return str: version pages are currently cached under
+        """
+
+        if self._checked_at is not None and monotonic() - self._checked_at < INDEX_REFRESH_SECONDS:
+            return self._version
+
+        with self._lock:
+            version = str(SyncCheckpoint.get_content_version())
+            if self._checked_at is not None and version != self._version:
+                self.backend.clear()
+            self._version = version
+            self._checked_at = monotonic()
+
+        return version
+
+    def get_key(self, query_args):
+        """Builds the cache key for the current request
+            :param query_args: [str] query string arguments the view reads, any others are left out of the key so
+                made up arguments can't fill the cache
+            :return str: key made of the content version, path and the view's arguments in a fixed order
+        """
+
+        args = sorted((name, value) for name in set(query_args) for value in request.args.getlist(name))
+        return f"{self.get_version()}:{request.path}?{urlencode(args)}"
+
+    def cached(self, view=None, query_args=()):
+        """Decorates a view so anonymous GET requests are answered from the cache, with an ETag
+
+        Requests with anything in the session, such as a logged in user or flashed messages, always run the view.
+        Use as @response_cache.cached, or @response_cache.cached(query_args=[...]) for views that read the query
+        string.
+
+            :param view: Flask view function
+            :param query_args: [str] query string arguments the view reads
+            :return: wrapped view function
+        """
+
+        if view is None:
+            return lambda view: self.cached(view, query_args)
+
+        @wraps(view)
+        def cached_view(*args, **kwargs):
+            if request.method != "GET" or session:
+                return view(*args, **kwargs)
+
+            key = self.get_key(query_args)
+            entry = self.backend.get(key)
+
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or session.modified:
+                    return response
+
+                body = response.get_data()
+                entry = {'body': body, 'mimetype': response.mimetype, 'etag': sha1(body).hexdigest()}
+                self.backend.set(key, entry)
+
+            # Lets browsers revalidate with If-None-Match and get an empty 304 when nothing changed
+            response = Response(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            return response.make_conditional(request)
+
+        return cached_view
+
+
+if RESPONSE_CACHE_DIR:
+    response_cache = ResponseCache(FileCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL))
+else:
+    response_cache = ResponseCache(LRUCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL))
+
+register_cache("response", response_cache.backend)
@@ -0,0 +1,101 @@
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+from .db import db
+from .category import Category
+from .congressperson import Congressperson
+from .sync_checkpoint import SyncCheckpoint
+from .consts import INDEX_REFRESH_SECONDS
+from .helpers import normalize_search_text
+
+
+class SuggestIndex:
+    """In-memory prefix index over member names and titles and category names, backing /api/suggest
+
+    Every word of a suggestion starts a key, so "warr" finds "Elizabeth Warren". Keys are kept in one sorted list
+    and a search is a binary search followed by a scan of the keys sharing the prefix.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._suggestions = []
+        self._built_for = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    def build(self, suggestions):
+        """Replaces the index with new suggestions
+            :param suggestions: [dict] each with a label to show, a kind, and any extra fields for the page
+            :return None
+        """
+
+        keys = []
+        for position, suggestion in enumerate(suggestions):
+            words = normalize_search_text(suggestion['label'] + " " + suggestion.get('keywords', "")).split()
+            for start in range(len(words)):
+                keys.append((" ".join(words[start:]), start, position))
+        keys.sort()
+
+        # Swap both lists in at once so searches never see half an index
+        self._keys, self._suggestions = keys, suggestions
+
+    def build_from_db(self):
+        """Rebuilds the index from the members and categories in the database
+            :return None
+        """
+
+        suggestions = [{'label': name, 'kind': "member", 'congress_id': congress_id, 'keywords': title}
+                       for congress_id, name, title
+                       in db.session.query(Congressperson.congress_id, Congressperson.name, Congressperson.title)]
+        suggestions += [{'label': name.strip(), 'kind': "category", 'category_id': category_id}
+                        for category_id, name in db.session.query(Category.category_id, Category.name)]
+        self.build(suggestions)
+
+    def refresh_if_stale(self):
+        """Builds the index if it was never built, or rebuilds it if sync.py has run since it was built
+
+        The database is asked at most once every INDEX_REFRESH_SECONDS, so most searches never touch it.
+
+            :return None
+        """
+
+        if self._checked_at is not None and monotonic() - self._checked_at < INDEX_REFRESH_SECONDS:
+            return
+
+        with self._lock:
+            self._checked_at = monotonic()
+            last_sync = SyncCheckpoint.get_last_sync()
+            if not self._suggestions or last_sync != self._built_for:
+                self.build_from_db()
+                self._built_for = last_sync
+
+    def search(self, query, kind=None, limit=10):
+        """Finds suggestions with a word starting with the query
+            :param query: str typed by the user
+            :param kind: str, only return suggestions of this kind
+            :param limit: int, most suggestions returned
+            :return [dict]: suggestions, those whose label starts with the query first, then shortest label first
+        """
+
+        prefix = normalize_search_text(query)
+        if not prefix:
+            return []
+
+        keys, suggestions = self._keys, self._suggestions
+        best = {}
+        index = bisect_left(keys, (prefix,))
+        while index < len(keys) and keys[index][0].startswith(prefix):
+            key, start, position = keys[index]
+            suggestion = suggestions[position]
+            if kind is None or suggestion['kind'] == kind:
+                rank = (start > 0, len(suggestion['label']), suggestion['label'])
+                if position not in best or rank < best[position]:
+                    best[position] = rank
+            index += 1
+
+        ranked = sorted(best, key=best.get)[:limit]
+        return [{key: value for key, value in suggestions[position].items() if key != 'keywords'}
+                for position in ranked]
+
+
+suggest_index = SuggestIndex()
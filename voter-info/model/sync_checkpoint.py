@@ -0,0 +1,79 @@
+from datetime import datetime
+from sqlalchemy import func
+from .db import db
+
+
+class SyncCheckpoint(db.Model):
+    """Where the last sync left off for one ProPublica feed, such as a subject or a chamber's roster
+
+    latest_action_date is the most recent bill action seen on a subject feed, older bills are skipped by sync.py.
+    """
+
+    __tablename__ = "sync_checkpoints"
+
+    # Not a feed, checked_at is bumped whenever ingest changes members, categories or bills
+    CONTENT_KEY = "content"
+
+    sync_key = db.Column(db.String, primary_key=True)
+    latest_action_date = db.Column(db.DateTime)
+    response_hash = db.Column(db.String(64))
+    checked_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<sync_key={self.sync_key}, checked_at={self.checked_at}>'
+
+    @classmethod
+    def get_checkpoints(cls, sync_keys):
+        """Gets the checkpoints for many feeds at once, creating any that do not exist yet
+            :param sync_keys: [str] keys of the feeds
+            :return {str: SyncCheckpoint}: checkpoints keyed by sync_key
+        """
+
+        checkpoints = {checkpoint.sync_key: checkpoint
+                       for checkpoint in cls.query.filter(cls.sync_key.in_(sync_keys))}
+
+        for sync_key in sync_keys:
+            if sync_key not in checkpoints:
+                checkpoints[sync_key] = cls(sync_key=sync_key)
+                db.session.add(checkpoints[sync_key])
+
+        return checkpoints
+
+    @classmethod
+    def get_last_sync(cls):
+        """Gets when sync.py last checked any feed, which tells in-memory indexes whether to rebuild
+            :return datetime: most recent check, or None if sync.py never ran
+        """
+
+        return db.session.query(func.max(cls.checked_at)).scalar()
+
+    @classmethod
+    def mark_content_changed(cls):
+        """Records that members, categories or bills changed, so cached pages are thrown away
+
+        Added to the session, the caller commits it along with the changes.
+
+            :return None
+        """
+
+        checkpoint = cls.query.get(cls.CONTENT_KEY)
+        if checkpoint is None:
+            checkpoint = cls(sync_key=cls.CONTENT_KEY)
+            db.session.add(checkpoint)
+        checkpoint.checked_at = datetime.now()
+
+    @classmethod
+    def get_content_version(cls):
+        """Gets when members, categories or bills last changed
+            :return datetime: last change, or None if nothing has been marked changed yet
+        """
+
+        return db.session.query(cls.checked_at).filter(cls.sync_key == cls.CONTENT_KEY).scalar()
+
+    def is_due(self, interval):
+        """Checks whether the feed should be fetched again
+            :param interval: timedelta, how long a check counts as up to date
+            :return bool: True if the feed was never checked or was last checked longer ago than interval
+        """
+
+        return self.checked_at is None or datetime.now() - self.checked_at >= interval
@@ -1,3 +1,4 @@
+from sqlalchemy.orm import joinedload
 from .db import db
 
 
@@ -15,35 +16,45 @@ class User(db.Model):
     def __repr__(self):
         return f'<user_id={self.user_id}, address={self.address}>'
 
+    @classmethod
+    def get_with_categories(cls, user_id):
+        """Gets a user along with the categories they follow in one query
+            :param user_id: int
+            :return User: user with user_categories and their categories already loaded, None if there is no such user
+        """
+        from . import UserCategory
+
+        return cls.query.options(joinedload(cls.user_categories).joinedload(UserCategory.category)).get(user_id)
+
+    def get_categories(self):
+        """Gets the categories the user follows
+            :return [Category]: followed categories
+        """
+
+        return [user_category.category for user_category in self.user_categories]
+
     def add_user_categories(self, categories):
         """Adds a list of categories associated with user to database
 
             :param categories: categories to be added that will now be associated with User instance
             :type categories: list of Category
-            :return None: UserCategories are added to database
+            :return int: number of categories added, ones the user already follows are skipped
         """
         from . import UserCategory
 
-        added_categories = []
-
-        for category in categories:
-            # Only append user_categories if they are not in database, we do not want multiple copies of same category
-            if not UserCategory.query.filter(UserCategory.user_id == self.user_id,
-                                             UserCategory.category_id == category.category_id).first():
-                added_categories.append(UserCategory(user_id=self.user_id, category_id=category.category_id))
-
-        db.session.add_all(added_categories)
-        db.session.commit()
-
-    # def remove_user_categories(self, categories):
-    #     """
-    #
-    #         :param categories:
-    #         :return:
-    #     """
-    #
-    #     for category in categories:
-    #         if UserCategory.query.filter(UserCategory.user_id == self.user_id,
-    #                                      UserCategory.category_id == category.category_id).first():
-    #             db.session.
+        added, removed = UserCategory.change_subscriptions(self.user_id,
+                                                           subscribe=[category.category_id for category in categories])
+        return added
+
+    def remove_user_categories(self, categories):
+        """Removes a list of categories from the user's watched categories
+
+            :param categories: categories the User instance should stop following
+            :type categories: list of Category
+            :return int: number of categories removed
+        """
+        from . import UserCategory
 
+        added, removed = UserCategory.change_subscriptions(self.user_id,
+                                                           unsubscribe=[category.category_id for category in categories])
+        return removed
@@ -1,12 +1,15 @@
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from .db import db
 from .user import User
 from .category import Category
 
 
 class UserCategory(db.Model):
-    """"""
+    """UserCategory for Voter Info Project"""
 
     __tablename__ = "user_categories"
+    __table_args__ = (db.UniqueConstraint("user_id", "category_id", name="uq_user_categories_user_category"),
+                      db.Index("ix_user_categories_category_user", "category_id", "user_id"))
 
     user_category_id = db.Column(db.Integer, autoincrement=True, primary_key=True)
     category_id = db.Column(db.Integer, db.ForeignKey(Category.category_id), nullable=False)
@@ -14,3 +17,39 @@ class UserCategory(db.Model):
 
     category = db.relationship("Category", backref="user_categories")
     user = db.relationship("User", backref="user_categories")
+
+    @classmethod
+    def change_subscriptions(cls, user_id, subscribe=(), unsubscribe=()):
+        """Follows and unfollows categories for a user with one statement each, however many categories there are
+            :param user_id: int, user whose categories are changing
+            :param subscribe: [int] category_ids to follow, ones already followed or that don't exist are skipped
+            :param unsubscribe: [int] category_ids to stop following, ones not followed are skipped
+            :return (int, int): number of categories followed and unfollowed
+        """
+
+        added = removed = 0
+        table = cls.__table__
+
+        if subscribe:
+            # Selecting from categories drops ids that don't exist instead of failing on the foreign key
+            new_rows = (db.session.query(db.literal(user_id), Category.category_id)
+                        .filter(Category.category_id.in_(subscribe)))
+
+            if db.engine.dialect.name == "postgresql":
+                statement = (postgresql_insert(table)
+                             .from_select(["user_id", "category_id"], new_rows)
+                             .on_conflict_do_nothing(index_elements=["user_id", "category_id"]))
+            else:
+                already_followed = (db.session.query(cls.user_category_id)
+                                    .filter(cls.user_id == user_id, cls.category_id == Category.category_id))
+                statement = table.insert().from_select(["user_id", "category_id"],
+                                                       new_rows.filter(~already_followed.exists()))
+
+            added = db.session.execute(statement).rowcount
+
+        if unsubscribe:
+            removed = (cls.query.filter(cls.user_id == user_id, cls.category_id.in_(unsubscribe))
+                       .delete(synchronize_session=False))
+
+        db.session.commit()
+        return added, removed
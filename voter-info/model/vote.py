@@ -0,0 +1,117 @@
+from .db import db
+from .bill import Bill
+
+
+class Vote(db.Model):
+    """Roll call vote on a bill for Voter Info Project"""
+
+    __tablename__ = "votes"
+
+    vote_id = db.Column(db.Integer, autoincrement=True, primary_key=True)
+    bill_id = db.Column(db.String, db.ForeignKey(Bill.bill_id), nullable=False, index=True)
+    chamber = db.Column(db.String(16), nullable=False)
+    congress = db.Column(db.Integer)
+    session = db.Column(db.Integer)
+    roll_call = db.Column(db.Integer)
+    question = db.Column(db.String)
+    result = db.Column(db.String(64))
+    vote_date = db.Column(db.DateTime)
+    api_url = db.Column(db.String, unique=True, nullable=False)
+
+    bill = db.relationship("Bill", backref="votes")
+
+    def __repr__(self):
+        return f'<vote_id={self.vote_id}, bill_id={self.bill_id}, chamber={self.chamber}, roll_call={self.roll_call}>'
+
+    def to_dict(self):
+        """Serializes the roll call for the JSON api
+            :return dict: roll call details and outcome
+        """
+
+        return {'chamber': self.chamber,
+                'congress': self.congress,
+                'session': self.session,
+                'roll_call': self.roll_call,
+                'question': self.question,
+                'result': self.result,
+                'vote_date': self.vote_date.strftime('%Y-%m-%d') if self.vote_date else None,
+                }
+
+    @classmethod
+    def get_latest_votes(cls, bill):
+        """Gets the most recent roll call in each chamber for a bill
+            :param bill: Bill whose votes you want
+            :return {str: Vote}: most recent Vote keyed by chamber
+        """
+
+        return cls.get_latest_votes_for_bills([bill.bill_id]).get(bill.bill_id, {})
+
+    @classmethod
+    def get_latest_votes_for_bills(cls, bill_ids):
+        """Gets the most recent roll call in each chamber for many bills with one query
+            :param bill_ids: [str] bills whose votes you want
+            :return {str: {str: Vote}}: most recent Vote keyed by chamber, keyed by bill_id, bills without votes are
+                left out
+        """
+
+        if not bill_ids:
+            return {}
+
+        votes = (cls.query.filter(cls.bill_id.in_(bill_ids))
+                 .order_by(cls.vote_date.desc(), cls.roll_call.desc()).all())
+
+        latest_votes = {}
+        for vote in votes:
+            latest_votes.setdefault(vote.bill_id, {}).setdefault(vote.chamber, vote)
+        return latest_votes
+
+
+class VotePosition(db.Model):
+    """How a single member of Congress voted on a roll call for Voter Info Project"""
+
+    __tablename__ = "vote_positions"
+    __table_args__ = (db.UniqueConstraint("vote_id", "congress_id"),)
+
+    vote_position_id = db.Column(db.Integer, autoincrement=True, primary_key=True)
+    vote_id = db.Column(db.Integer, db.ForeignKey(Vote.vote_id), nullable=False)
+    congress_id = db.Column(db.String, nullable=False)
+    vote_position = db.Column(db.String(32), nullable=False)
+
+    vote = db.relationship("Vote", backref="positions")
+
+    @classmethod
+    def get_member_positions(cls, votes, congresspeople):
+        """Looks up how each congressperson voted on the roll call held in their chamber
+            :param votes: {str: Vote} votes keyed by chamber, as returned by Vote.get_latest_votes
+            :param congresspeople: [Congressperson] members whose votes you want
+            :return {str: str}: vote position keyed by congress_id
+        """
+
+        return cls.get_member_positions_for_bills({None: votes}, congresspeople).get(None, {})
+
+    @classmethod
+    def get_member_positions_for_bills(cls, votes_by_bill, congresspeople):
+        """Looks up how each congressperson voted on the roll call held in their chamber, for many bills with one query
+            :param votes_by_bill: {str: {str: Vote}} votes keyed by chamber keyed by bill_id, as returned by
+                Vote.get_latest_votes_for_bills
+            :param congresspeople: [Congressperson] members whose votes you want
+            :return {str: {str: str}}: vote position keyed by congress_id, keyed by bill_id
+        """
+
+        vote_ids = [vote.vote_id for votes in votes_by_bill.values() for vote in votes.values()]
+        congress_ids = [member.congress_id for member in congresspeople]
+        if not vote_ids or not congress_ids:
+            return {}
+
+        positions = cls.query.filter(cls.vote_id.in_(vote_ids), cls.congress_id.in_(congress_ids)).all()
+        bill_and_chamber_by_vote = {vote.vote_id: (bill_id, chamber)
+                                    for bill_id, votes in votes_by_bill.items() for chamber, vote in votes.items()}
+        chamber_by_member = {member.congress_id: member.get_chamber() for member in congresspeople}
+
+        # Only keep a member's position on the vote held in their own chamber
+        member_positions = {}
+        for position in positions:
+            bill_id, chamber = bill_and_chamber_by_vote[position.vote_id]
+            if chamber == chamber_by_member[position.congress_id]:
+                member_positions.setdefault(bill_id, {})[position.congress_id] = position.vote_position
+        return member_positions
@@ -0,0 +1,48 @@
+from datetime import datetime
+from .db import db
+from .sync_checkpoint import SyncCheckpoint
+from .consts import INGEST_BATCH_SIZE
+from .helpers import iter_batches
+
+
+class ZipDistrict(db.Model):
+    """Congressional district overlapping a ZIP code tabulation area (ZCTA), imported with load_districts.py
+
+    A ZCTA can overlap several districts, or even several states, so there is one row per district it touches.
+    """
+
+    __tablename__ = "zip_districts"
+
+    # Not a feed, checked_at is bumped whenever the districts are imported so resolvers rebuild
+    SYNC_KEY = "zip_districts"
+
+    zcta = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    state = db.Column(db.String(2), primary_key=True)
+    district = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    def __repr__(self):
+        return f'<zcta={self.zcta:05d}, state={self.state}, district={self.district}>'
+
+    @classmethod
+    def replace_all(cls, rows):
+        """Replaces every ZCTA to district row in one transaction
+            :param rows: iterable of (int, str, int) zcta, state and district, 0 for at-large seats
+            :return int: number of rows stored
+        """
+
+        cls.query.delete()
+
+        count = 0
+        for batch in iter_batches(rows, INGEST_BATCH_SIZE):
+            db.session.bulk_insert_mappings(cls, [{'zcta': zcta, 'state': state, 'district': district}
+                                                  for zcta, state, district in batch])
+            count += len(batch)
+
+        checkpoint = SyncCheckpoint.query.get(cls.SYNC_KEY)
+        if checkpoint is None:
+            checkpoint = SyncCheckpoint(sync_key=cls.SYNC_KEY)
+            db.session.add(checkpoint)
+        checkpoint.checked_at = datetime.now()
+
+        db.session.commit()
+        return count
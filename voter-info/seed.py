@@ -1,8 +1,9 @@
 from model import *
-import requests
-from model.helpers import parse_name, parse_year
-from model.consts import PROPUBLICA_KEY, HOUSE_URL, SENATE_URL
-from api_request import parse_bills_by_category, find_representatives
+from model.helpers import parse_name, parse_year, parse_chamber, normalize_name, iter_json_items, iter_batches
+from model.consts import HOUSE_URL, SENATE_URL, INGEST_BATCH_SIZE
+from model.api_client import propublica, use_background_priority
+from model.migrations import migrate
+from api_request import load_bills_by_categories, find_representatives
 from os import environ
 
 def create_dummy_user():
@@ -23,15 +24,11 @@ def load_congresspeople_into_db():
     :return None
     """
 
-    # load senators
-    fill_senate_request = requests.get(SENATE_URL, headers={'X-API-Key': PROPUBLICA_KEY})
-    senate_json = fill_senate_request.json()
-    parse_members_from_json(senate_json)
-
-    # load representatives
-    fill_house_request = requests.get(HOUSE_URL, headers={'X-API-Key': PROPUBLICA_KEY})
-    house_json = fill_house_request.json()
-    parse_members_from_json(house_json)
+    # load senators and representatives, each roster is written to the database as it is read
+    for url in [SENATE_URL, HOUSE_URL]:
+        with propublica.stream(url) as body:
+            counts = parse_members(iter_json_items(body, "results.item.members"))
+        print(f"{url}: {counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged")
 
 
 def load_categories_into_db():
@@ -45,50 +42,55 @@ def load_categories_into_db():
             categories.append(Category(name=line))
 
         db.session.add_all(categories)
+        SyncCheckpoint.mark_content_changed()
         db.session.commit()
 
 
 def parse_members_from_json(json):
-    """Reads a json file and updates database with Congress members
+    """Reads a json file and upserts every Congress member in it
         :param json: ProPublica member json file
-        :return None: updates database with information
+        :return dict: number of congresspeople inserted, updated and unchanged
+    """
+
+    return parse_members(json["results"][0]['members'])
+
+
+def parse_members(members):
+    """Upserts Congress members a batch at a time, so a roster can be streamed in as it is parsed
+        :param members: iterable of member dictionaries from a ProPublica roster
+        :return dict: number of congresspeople inserted, updated and unchanged
     """
 
-    members = json["results"][0]['members']
-
-    for member in members:
-        if member['in_office'] is False:
-            print("skip")
-        else:
-            congress_id = member['id']
-            name = parse_name(member['first_name'], member['last_name'])
-            title = member['title']
-            party = member['party']
-            phone = member['phone']
-            next_election = parse_year(member['next_election'])
-            twitter = member['twitter_account']
-            facebook = member['facebook_account']
-            youtube = member['youtube_account']
-            try:
-                votes_with_party_pct = member['votes_with_party_pct']
-            except KeyError:
-                votes_with_party_pct = None;
-
-
-            congressperson = Congressperson(congress_id=congress_id,
-                                            name=name,
-                                            title=title,
-                                            party=party,
-                                            phone=phone,
-                                            votes_with_party_pct=votes_with_party_pct,
-                                            next_election=next_election,
-                                            twitter=twitter,
-                                            facebook=facebook,
-                                            youtube=youtube
-                                            )
-
-            db.session.add(congressperson)
-            db.session.commit()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    for batch in iter_batches(members, INGEST_BATCH_SIZE):
+        rows = []
+        for member in batch:
+            if member['in_office'] is False:
+                print("skip")
+            else:
+                name = parse_name(member['first_name'], member['last_name'])
+                rows.append({'congress_id': member['id'],
+                             'name': name,
+                             'name_key': normalize_name(name),
+                             'title': member['title'],
+                             'chamber': parse_chamber(member['title']),
+                             'party': member['party'],
+                             'state': member['state'],
+                             'district': member.get('district'),
+                             'phone': member['phone'],
+                             'votes_with_party_pct': member.get('votes_with_party_pct'),
+                             'next_election': parse_year(member['next_election']),
+                             'twitter': member['twitter_account'],
+                             'facebook': member['facebook_account'],
+                             'youtube': member['youtube_account'],
+                             })
+
+        if rows:
+            for key, count in Congressperson.bulk_upsert(rows).items():
+                counts[key] += count
+
+    return counts
 
 
 if __name__ == "__main__":
@@ -98,8 +100,9 @@ if __name__ == "__main__":
     from server import app
 
     connect_to_db(app)
+    use_background_priority()
     # db.drop_all()
-    db.create_all()
+    migrate()
 
     print("Connected to DB.")
     print("\n\n\n=============================================")
@@ -129,10 +132,6 @@ if __name__ == "__main__":
     print("\n\n\n=============================================")
 
     # # Import Bills
-    # for category in categories:
-    #     try:
-    #         parse_bills_by_category(category)
-    #     except ValueError:
-    #         print('Decoding JSON has failed')
+    # load_bills_by_categories(categories)
 
     print("\n\n\n=============================================")
\ No newline at end of file
@@ -1,12 +1,23 @@
 from os import environ
+from time import perf_counter
 
-from flask import (Flask, render_template, redirect, request, flash, session)
+from flask import (Flask, Response, render_template, redirect, request, flash, session, jsonify, g, abort,
+                   stream_with_context)
 from flask_debugtoolbar import DebugToolbarExtension
 from jinja2 import StrictUndefined
 from sqlalchemy import or_
 from sqlalchemy.orm.exc import NoResultFound
-from model import Bill, Congressperson, Category, UserCategory, db
+from model import Bill, Congressperson, Category, UserCategory, Vote, VotePosition, db, connect_to_db
 from model.user import User
+from model.consts import (MAX_PAGE_SIZE, SUGGEST_LIMIT, SEARCH_PAGE_SIZE, FEED_PAGE_SIZE, EXPORT_TOKEN,
+                          MAX_BILLS_PER_REQUEST)
+from model.helpers import parse_date
+from model.bill_search import search_bills
+from model.suggest import suggest_index
+from model.response_cache import response_cache
+from model.metrics import http_request_seconds, render_metrics
+from model.analytics import get_chamber_analytics, get_member_stats
+from model.export import DATASETS, PRIVATE_DATASETS, FORMATS, iter_csv, iter_arrow, pyarrow
 from api_request import find_representatives
 
 
@@ -21,11 +32,88 @@ app.secret_key = environ['FLASK_SECRET_KEY']
 app.jinja_env.undefined = StrictUndefined
 
 
+########################################################################################################################
+# Request Timing
+
+
+@app.before_request
+def start_timer():
+    """Notes when the request started, for the per route latency on /metrics"""
+
+    g.request_started = perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    """Records how long the request took under its route pattern, so every bill page counts towards one series"""
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    http_request_seconds.observe((route, request.method, str(response.status_code)),
+                                 perf_counter() - g.request_started)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Request and outbound api metrics in the Prometheus text format"""
+
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+########################################################################################################################
+# Logged In User
+
+
+def get_current_user():
+    """Gets the logged in user, loaded with the categories they follow the first time it is asked for in a request
+        :return User: logged in user, None if nobody is logged in
+    """
+
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = User.get_with_categories(user_id) if user_id else None
+    return g.current_user
+
+
+def get_current_representatives():
+    """Gets the logged in user's members of Congress, found at most once per request
+        :return [Congressperson]: senators and representative for the user's address, empty if nobody is logged in
+    """
+
+    if 'current_representatives' not in g:
+        user = get_current_user()
+        g.current_representatives = find_representatives(user) if user else []
+    return g.current_representatives
+
+
+def get_followed_categories():
+    """Gets the categories the logged in user follows
+        :return [Category]: followed categories, empty if nobody is logged in
+    """
+
+    user = get_current_user()
+    return user.get_categories() if user else []
+
+
+@app.context_processor
+def inject_current_user():
+    """Lets every template reach the logged in user, their members and their categories
+
+    The getters are passed rather than their results so pages that never ask, such as cached anonymous pages, don't
+    touch the session or the database.
+    """
+
+    return {'current_user': get_current_user,
+            'current_representatives': get_current_representatives,
+            'followed_categories': get_followed_categories}
+
+
 ########################################################################################################################
 # Home Page
 
 
 @app.route('/')
+@response_cache.cached
 def index():
     """Homepage."""
 
@@ -39,43 +127,88 @@ def index():
 def user_profile():
     """Show user information"""
 
-    user_id = session["user_id"]
-    user = User.query.get(user_id)
-    representatives = find_representatives(user)
-    vote_percents = [rep.votes_with_party_pct for rep in representatives]
-    return render_template("user_profile.html", user=user, representatives=representatives, vote_percents=vote_percents)
+    if not get_current_user():
+        flash("You are not logged in and do not have access to this page")
+        return redirect('/')
+
+    member_stats = get_member_stats(get_current_representatives(), get_followed_categories())
+    return render_template("user_profile.html", member_stats=member_stats)
 
 
 ########################################################################################################################
 # Congress Pages
 
 @app.route('/congresspeople')
+@response_cache.cached
 def show_congress():
-    """Creates a page of current congress divided by senators and representatives"""
+    """Creates a page of current congress divided by senators and representatives, members are loaded from
+    /api/congresspeople as the page is scrolled"""
+
+    return render_template("congress_list.html")
+
+
+@app.route('/api/congresspeople')
+def congress_api():
+    """JSON page of congresspeople, filterable by chamber, party, state, next election year, name and congress_id"""
+
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 50, type=int), MAX_PAGE_SIZE)
+
+    query = Congressperson.filter_by_fields(chamber=request.args.get('chamber'),
+                                            party=request.args.get('party'),
+                                            state=request.args.get('state'),
+                                            next_election=request.args.get('next_election', type=int),
+                                            name=request.args.get('name'),
+                                            congress_id=request.args.get('congress_id'))
+    congress_page = query.paginate(page, per_page, error_out=False)
+
+    # Party unity computed from our own roll calls, falling back to ProPublica's figure in the chart
+    analytics = {chamber: get_chamber_analytics(chamber)
+                 for chamber in {member.get_chamber() for member in congress_page.items}}
+    congresspeople = []
+    for member in congress_page.items:
+        member_dict = member.to_dict()
+        member_dict['party_unity_pct'] = analytics[member.get_chamber()].get_party_unity(member.congress_id)
+        congresspeople.append(member_dict)
+
+    response = jsonify(congresspeople=congresspeople,
+                       page=page,
+                       per_page=per_page,
+                       total=congress_page.total,
+                       next_page=congress_page.next_num if congress_page.has_next else None)
+
+    # Lets browsers revalidate with If-None-Match and get an empty 304 when nothing changed
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route('/api/suggest')
+def suggest_api():
+    """JSON typeahead suggestions for members and categories whose words start with q"""
+
+    suggest_index.refresh_if_stale()
+    suggestions = suggest_index.search(request.args.get('q', ''),
+                                       kind=request.args.get('kind'),
+                                       limit=min(request.args.get('limit', SUGGEST_LIMIT, type=int), MAX_PAGE_SIZE))
+    return jsonify(suggestions=suggestions)
+
 
-    representatives = Congressperson.get_representatives()
-    senators = Congressperson.get_senators()
-    congress = representatives + senators
-    congress_names = [rep.name for rep in congress]
-    vote_percents = [rep.votes_with_party_pct for rep in congress]
+@app.before_first_request
+def build_suggest_index():
+    """Builds the typeahead index at startup so the first search doesn't pay for it"""
 
-    return render_template("congress_list.html",
-                           congress_names=congress_names,
-                           vote_percents=vote_percents,
-                           representatives=representatives,
-                           senators=senators)
+    suggest_index.refresh_if_stale()
 
 ########################################################################################################################
 # Category Pages
 
 
 @app.route('/categories')
+@response_cache.cached
 def show_categories():
     """"""
     categories = Category.query.all()
-    category_names = [category.name for category in categories]
-    print(category_names)
-    return render_template("categories.html", categories=categories, category_names=category_names)
+    return render_template("categories.html", categories=categories)
 
 
 @app.route('/add-categories', methods=['POST'])
@@ -83,12 +216,13 @@ def add_user_categories():
     """"""
 
     if session.get('user_id'):
-        categories = request.form.getlist("categories")
-        user_categories = [UserCategory(user_id=session['user_id'], category_id=category_id)
-                           for category_id in categories]
-        db.session.add_all(user_categories)
-        db.session.commit()
-        flash("You have added categories to your profile")
+        category_ids = request.form.getlist("categories", type=int)
+        added, removed = UserCategory.change_subscriptions(session['user_id'], subscribe=category_ids)
+
+        if added < len(set(category_ids)):
+            flash(f"Added {added} categories, you already follow the rest or they could not be added")
+        else:
+            flash("You have added categories to your profile")
         return redirect('/')
 
     else:
@@ -100,11 +234,8 @@ def add_user_categories():
 def show_user_categories():
     """"""
 
-    if session.get('user_id'):
-        user = User.query.get(session['user_id'])
-        categories = Category.query.join(UserCategory).filter_by(user_id=user.user_id).all()
-        print(categories)
-        return render_template("user_categories.html", categories=categories)
+    if get_current_user():
+        return render_template("user_categories.html", categories=get_followed_categories())
 
     else:
         flash("You are not logged in and do not have access to this page")
@@ -117,20 +248,13 @@ def remove_user_categories():
 
     if session.get('user_id'):
         user_id = session['user_id']
-        category_ids = request.form.getlist('categories')
-        for category_id in category_ids:
-
-            try:
-                user_category = UserCategory.query.filter_by(user_id=user_id, category_id=category_id).one()
-
-            except NoResultFound:
-                flash(f"Could not delete category {category_id}")
-
-            else:
-                db.session.delete(user_category)
-                db.session.commit()
+        category_ids = request.form.getlist('categories', type=int)
+        added, removed = UserCategory.change_subscriptions(user_id, unsubscribe=category_ids)
 
-        flash("Successfully removed categories")
+        if removed < len(set(category_ids)):
+            flash(f"Removed {removed} categories, could not remove some of those categories")
+        else:
+            flash("Successfully removed categories")
         return redirect('/user-categories')
 
     else:
@@ -142,32 +266,136 @@ def remove_user_categories():
 # Bill Pages
 
 @app.route('/categories/<category_id>')
+@response_cache.cached
 def show_bills_by_category(category_id):
     """"""
 
     category = Category.query.filter_by(category_id=category_id).first()
     bills = Bill.retrieve_bills_by_category(category)
-    [print(bill) for bill in bills]
 
-    return render_template("bills_by_category.html", category=category, bills=bills)
+    return render_template("bills_by_category.html",
+                           category=category,
+                           bills=bills,
+                           max_bills_per_request=MAX_BILLS_PER_REQUEST)
+
+
+@app.route('/search')
+def search_bill_text():
+    """Keyword search over bill titles and summaries, optionally within one category"""
+
+    query = request.args.get('q', '').strip()
+    category_id = request.args.get('category_id', type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    bills, total = search_bills(query, category_id, page, SEARCH_PAGE_SIZE) if query else ([], 0)
+    category = Category.query.get(category_id) if category_id else None
+
+    return render_template("search_results.html",
+                           query=query,
+                           category=category,
+                           bills=bills,
+                           total=total,
+                           page=page,
+                           has_next=page * SEARCH_PAGE_SIZE < total)
+
+
+@app.route('/api/bills')
+def bills_api():
+    """JSON roll call outcomes for many bills at once, given as repeated bill_id parameters, along with how the
+    logged in user's members of Congress voted on each"""
+
+    bill_ids = list(dict.fromkeys(request.args.getlist('bill_id')))
+    if len(bill_ids) > MAX_BILLS_PER_REQUEST:
+        return jsonify(error=f"At most {MAX_BILLS_PER_REQUEST} bill_ids can be requested at once"), 400
+
+    # A fresh address lookup commits, so find the user's members before loading anything the commit would expire
+    representatives = get_current_representatives()
+
+    # Only reads, bills nobody has refreshed yet are already stale and get queued by worker.py
+    bills = Bill.query.filter(Bill.bill_id.in_(bill_ids)).all() if bill_ids else []
+
+    votes_by_bill = Vote.get_latest_votes_for_bills([bill.bill_id for bill in bills])
+    member_positions = VotePosition.get_member_positions_for_bills(votes_by_bill, representatives)
+
+    found = {bill.bill_id for bill in bills}
+    return jsonify(bills=[{'bill_id': bill.bill_id,
+                           'bill_title': bill.bill_title,
+                           'refreshed': bill.refreshed_at is not None,
+                           'votes': {chamber: vote.to_dict()
+                                     for chamber, vote in votes_by_bill.get(bill.bill_id, {}).items()},
+                           'member_votes': member_positions.get(bill.bill_id, {}),
+                           } for bill in bills],
+                   representatives=[{'congress_id': member.congress_id,
+                                     'name': member.name,
+                                     'title': member.title,
+                                     'chamber': member.get_chamber()} for member in representatives],
+                   missing=[bill_id for bill_id in bill_ids if bill_id not in found])
+
+
+@app.route('/feed')
+def show_feed():
+    """Latest bills across every category the user follows, paged with before_date and before_bill"""
+
+    if not session.get('user_id'):
+        flash("You are not logged in and do not have access to this page")
+        return redirect('/')
+
+    before_date = request.args.get('before_date')
+    before_bill = request.args.get('before_bill')
+    try:
+        before = (parse_date(before_date), before_bill) if before_date and before_bill else None
+    except ValueError:
+        before = None
+
+    bills, next_before = Bill.get_feed(session['user_id'], before, FEED_PAGE_SIZE)
+
+    return render_template("feed.html", bills=bills, next_before=next_before)
 
 
 @app.route('/bills/<bill_id>')
 def show_bill_info(bill_id):
     """"""
 
-    if session.get('user_id'):
-        user = User.query.get(session['user_id'])
-        representatives = find_representatives(user)
-
-    else:
-        user = None
-        representatives = None
+    # A fresh address lookup commits, so find the user's members before loading anything the commit would expire
+    representatives = get_current_representatives()
 
+    # Only reads, like /api/bills, a bill nobody has refreshed yet is stale and gets queued by worker.py
     bill = Bill.query.get(bill_id)
-    bill.set_roll_call_info()
 
-    return render_template("bill_info.html", bill=bill, user=user, representatives=representatives)
+    votes = Vote.get_latest_votes(bill)
+    member_votes = VotePosition.get_member_positions(votes, representatives)
+
+    return render_template("bill_info.html",
+                           bill=bill,
+                           votes=votes,
+                           member_votes=member_votes)
+
+
+########################################################################################################################
+# Data Export
+
+@app.route('/export/<dataset>')
+def export_dataset(dataset):
+    """Streams a whole dataset as CSV, or Arrow IPC with format=arrow, vote_positions can be limited to one congress
+
+    Subscriptions are user data, so user_categories needs the EXPORT_TOKEN in an X-Export-Token header.
+    """
+
+    file_format = request.args.get('format', 'csv')
+    if dataset not in DATASETS or file_format not in FORMATS:
+        abort(404)
+    if dataset in PRIVATE_DATASETS and (not EXPORT_TOKEN or request.headers.get('X-Export-Token') != EXPORT_TOKEN):
+        abort(403)
+    if file_format == 'arrow' and pyarrow is None:
+        abort(501)
+
+    congress = request.args.get('congress', type=int)
+    chunks = iter_csv(dataset, congress) if file_format == 'csv' else iter_arrow(dataset, congress)
+
+    # The rows are read from the database while the response is being sent
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
 
 
 ########################################################################################################################
@@ -257,16 +485,6 @@ def playChart():
 ########################################################################################################################
 # Main Function
 
-def connect_to_db(app):
-    """Connect the database to our Flask app."""
-
-    # Configure to use our PstgreSQL database
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql:///voteinfo'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db.app = app
-    db.init_app(app)
-
-
 if __name__ == "__main__":
     # We have to set debug=True here, since it has to be True at the
     # point that we invoke the DebugToolbarExtension
@@ -0,0 +1,137 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from hashlib import sha256
+from ijson import JSONError
+from requests import RequestException
+from model import db, connect_to_db, Category, SyncCheckpoint
+from model.consts import HOUSE_URL, SENATE_URL, INGEST_CONCURRENCY, SYNC_INTERVAL
+from model.api_client import propublica, use_background_priority
+from model.helpers import parse_date, iter_json_items
+from model.migrations import migrate
+from api_request import get_category_url, parse_bills_from_json
+from seed import parse_members
+
+
+def sync_members(full=False):
+    """Refreshes each chamber's roster
+
+    Rosters are streamed into the database as they are read, so members are compared by Congressperson.bulk_upsert
+    rather than skipped by the response hash, which only tells us whether to report the roster as changed.
+
+        :param full: bool, check every roster even if it was checked recently
+        :return None
+    """
+
+    rosters = {"chamber:senate": SENATE_URL, "chamber:house": HOUSE_URL}
+    checkpoints = SyncCheckpoint.get_checkpoints(list(rosters))
+    db.session.commit()
+
+    due = [sync_key for sync_key in rosters if full or checkpoints[sync_key].is_due(SYNC_INTERVAL)]
+
+    for sync_key in due:
+        checkpoint = checkpoints[sync_key]
+
+        try:
+            with propublica.stream(rosters[sync_key]) as body:
+                counts = parse_members(iter_json_items(body, "results.item.members"))
+                response_hash = body.hexdigest()
+        except (RequestException, JSONError) as error:
+            print(f"{sync_key} failed: {error}")
+            db.session.rollback()
+            continue
+
+        if response_hash != checkpoint.response_hash:
+            print(f"{sync_key}: {counts['inserted']} inserted, {counts['updated']} updated, "
+                  f"{counts['unchanged']} unchanged")
+            checkpoint.response_hash = response_hash
+
+        checkpoint.checked_at = datetime.now()
+        db.session.commit()
+
+
+def get_new_bills(bills, checkpoint):
+    """Drops bills with no action since the subject was last synced, they are already stored and unchanged
+
+    Bills with action on the same day as the last synced bill are kept, a bill can get action later that day.
+
+        :param bills: [dict] bills from a ProPublica subject JSON
+        :param checkpoint: SyncCheckpoint of the subject, or None to keep every bill
+        :return [dict]: bills to store
+    """
+
+    if checkpoint is None or checkpoint.latest_action_date is None:
+        return bills
+
+    return [bill for bill in bills if not bill.get('latest_major_action_date')
+            or parse_date(bill['latest_major_action_date']) >= checkpoint.latest_action_date]
+
+
+def sync_subjects(categories, full=False, concurrency=INGEST_CONCURRENCY):
+    """Refreshes the bills of each subject, skipping subjects whose response has not changed since the last sync
+
+    A checkpoint is committed after every subject, so a sync that crashes picks up where it left off when re-run
+    because subjects checked within SYNC_INTERVAL are skipped. Each checkpoint also keeps the latest action date
+    seen for the subject, and only bills with action since then are written.
+
+        :param categories: [Category] subjects to sync
+        :param full: bool, check every subject even if it was checked recently and write every bill it lists
+        :param concurrency: int, most ProPublica requests in flight at once
+        :return None
+    """
+
+    sync_keys = [f"subject:{category.category_id}" for category in categories]
+    checkpoints = SyncCheckpoint.get_checkpoints(sync_keys)
+    db.session.commit()
+
+    due = [(sync_key, category) for sync_key, category in zip(sync_keys, categories)
+           if full or checkpoints[sync_key].is_due(SYNC_INTERVAL)]
+    print(f"{len(due)} of {len(categories)} subjects due for sync")
+
+    search_urls = [get_category_url(category) for sync_key, category in due]
+    for (sync_key, category), (search_url, response) in zip(due, propublica.get_many(search_urls, concurrency)):
+        if response is None:
+            continue
+
+        checkpoint = checkpoints[sync_key]
+        response_hash = sha256(response.content).hexdigest()
+
+        if response_hash != checkpoint.response_hash:
+            try:
+                bill_json = response.json()
+            except ValueError:
+                print('Decoding JSON has failed')
+                continue
+
+            bills = bill_json.get('results') or []
+            bill_json = dict(bill_json, results=get_new_bills(bills, None if full else checkpoint))
+
+            counts = parse_bills_from_json(bill_json, category)
+            print(f"{category.name.rstrip()}: {counts['inserted']} new bills, {counts['updated']} updated bills")
+
+            action_dates = [parse_date(bill['latest_major_action_date'])
+                            for bill in bills if bill.get('latest_major_action_date')]
+            if checkpoint.latest_action_date:
+                action_dates.append(checkpoint.latest_action_date)
+            if action_dates:
+                checkpoint.latest_action_date = max(action_dates)
+            checkpoint.response_hash = response_hash
+
+        checkpoint.checked_at = datetime.now()
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    from server import app
+
+    parser = ArgumentParser(description="Incrementally sync members and bills from ProPublica")
+    parser.add_argument("--full", action="store_true", help="check every feed, even ones checked recently")
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY,
+                        help="most subject feeds downloaded at once, the two rosters are streamed one at a time")
+    args = parser.parse_args()
+
+    connect_to_db(app)
+    use_background_priority()
+    migrate()
+
+    sync_members(full=args.full)
+    sync_subjects(Category.query.order_by(Category.category_id).all(), full=args.full, concurrency=args.concurrency)
@@ -0,0 +1,59 @@
+from argparse import ArgumentParser
+from time import sleep
+from model import db, connect_to_db, RefreshJob
+from model.consts import WORKER_POLL_SECONDS
+from model.api_client import use_background_priority
+from api_request import load_votes_for_bill
+
+
+def work_off_queue():
+    """Refreshes queued bills until none are due, bills that fail are left queued to retry after a backoff
+        :return int: number of bills refreshed
+    """
+
+    refreshed = 0
+    job = RefreshJob.claim()
+    while job is not None:
+        bill_id = job.bill_id
+        print(f"Refreshing {bill_id}")
+        try:
+            load_votes_for_bill(job.bill)
+        except Exception as error:
+            # Bad responses, ProPublica being down or a failed write only cost this bill, which backs off
+            db.session.rollback()
+            run_after = job.retry_later()
+            print(f"Refreshing {bill_id} failed, retrying after {run_after:%Y-%m-%d %H:%M}: {error!r}")
+        else:
+            job.complete()
+            refreshed += 1
+        job = RefreshJob.claim()
+
+    return refreshed
+
+
+def run_worker(once=False):
+    """Keeps stale bills' roll call info up to date so pages never have to fetch it while rendering
+        :param once: bool, stop after the queue has been emptied once instead of polling forever
+        :return None
+    """
+
+    while True:
+        stale = RefreshJob.enqueue_stale_bills()
+        refreshed = work_off_queue()
+        print(f"{stale} stale bills queued, {refreshed} refreshed")
+
+        if once:
+            return
+        sleep(WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    from server import app
+
+    parser = ArgumentParser(description="Refresh stale bills' roll call info from ProPublica")
+    parser.add_argument("--once", action="store_true", help="empty the queue once and exit")
+    args = parser.parse_args()
+
+    connect_to_db(app)
+    use_background_priority()
+    run_worker(once=args.once)